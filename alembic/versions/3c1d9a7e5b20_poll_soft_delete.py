@@ -0,0 +1,39 @@
+"""poll soft delete
+
+Revision ID: 3c1d9a7e5b20
+Revises: fb357261458b
+Create Date: 2026-10-19 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1d9a7e5b20'
+down_revision: Union[str, Sequence[str], None] = 'fb357261458b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tables are also created by Base.metadata.create_all, so guard with IF NOT EXISTS
+    op.execute("ALTER TABLE polls ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP WITH TIME ZONE")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_polls_deleted_at ON polls (deleted_at)")
+
+    # the purger deletes children by poll_id in batches
+    op.execute("CREATE INDEX IF NOT EXISTS ix_votes_poll_id ON votes (poll_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_likes_poll_id ON likes (poll_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_options_poll_id ON options (poll_id)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_options_poll_id")
+    op.execute("DROP INDEX IF EXISTS ix_likes_poll_id")
+    op.execute("DROP INDEX IF EXISTS ix_votes_poll_id")
+    op.execute("DROP INDEX IF EXISTS ix_polls_deleted_at")
+    op.execute("ALTER TABLE polls DROP COLUMN IF EXISTS deleted_at")
@@ -0,0 +1,114 @@
+"""poll closing and vote partitions
+
+Revision ID: 5a7e0c3b9d41
+Revises: 8f2b6c4d1e93
+Create Date: 2026-10-19 16:02:18.447310
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7e0c3b9d41'
+down_revision: Union[str, Sequence[str], None] = '8f2b6c4d1e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# monthly partitions created past the current month
+MONTHS_AHEAD = 3
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_votes_table(partitioned: bool) -> None:
+    # the partition key has to be part of the primary key
+    primary_key = "PRIMARY KEY (id, created_at)" if partitioned else "PRIMARY KEY (id)"
+    partition_by = " PARTITION BY RANGE (created_at)" if partitioned else ""
+    op.execute(f"""
+        CREATE TABLE votes (
+            id UUID NOT NULL,
+            poll_id UUID NOT NULL REFERENCES polls (id) ON DELETE CASCADE,
+            option_id UUID NOT NULL REFERENCES options (id) ON DELETE CASCADE,
+            user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            {primary_key}
+        ){partition_by}
+    """)
+
+
+def _copy_votes() -> None:
+    op.execute("""
+        INSERT INTO votes (id, poll_id, option_id, user_id, created_at)
+        SELECT id, poll_id, option_id, user_id, created_at FROM votes_old
+    """)
+    op.execute("DROP TABLE votes_old")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_votes_poll_id ON votes (poll_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_votes_option_id ON votes (option_id)")
+
+
+def _rename_votes_table() -> None:
+    # free the table, primary key and index names for the new table
+    op.execute("ALTER TABLE votes RENAME TO votes_old")
+    op.execute("ALTER TABLE votes_old RENAME CONSTRAINT votes_pkey TO votes_old_pkey")
+    op.execute("DROP INDEX IF EXISTS ix_votes_poll_id")
+    op.execute("DROP INDEX IF EXISTS ix_votes_option_id")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tables are also created by Base.metadata.create_all, so guard with IF NOT EXISTS
+    op.execute("ALTER TABLE polls ADD COLUMN IF NOT EXISTS closes_at TIMESTAMP WITH TIME ZONE")
+    op.execute("ALTER TABLE polls ADD COLUMN IF NOT EXISTS closed_at TIMESTAMP WITH TIME ZONE")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_polls_closes_at ON polls (closes_at)")
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS poll_results (
+            poll_id UUID PRIMARY KEY REFERENCES polls (id) ON DELETE CASCADE,
+            closed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            total_votes INTEGER NOT NULL,
+            tallies JSON NOT NULL
+        )
+    """)
+
+    # votes becomes a table partitioned by month of created_at; a partitioned
+    # table cannot be created in place, so the rows are copied into a new one
+    bind = op.get_bind()
+    if bind.execute(sa.text("SELECT relkind FROM pg_class WHERE oid = to_regclass('votes')")).scalar() == "p":
+        return
+
+    _rename_votes_table()
+    _create_votes_table(partitioned=True)
+    op.execute("CREATE TABLE votes_default PARTITION OF votes DEFAULT")
+
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM votes_old")).scalar()
+    month = date.today().replace(day=1)
+    if oldest is not None:
+        month = min(month, oldest.date().replace(day=1))
+    last = _add_months(date.today().replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE votes_p{month:%Y%m} PARTITION OF votes "
+            f"FOR VALUES FROM ('{month} 00:00:00+00') TO ('{_add_months(month, 1)} 00:00:00+00')"
+        )
+        month = _add_months(month, 1)
+
+    _copy_votes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # detached (archived) partitions are not copied back
+    _rename_votes_table()
+    _create_votes_table(partitioned=False)
+    _copy_votes()
+
+    op.execute("DROP TABLE IF EXISTS poll_results")
+    op.execute("DROP INDEX IF EXISTS ix_polls_closes_at")
+    op.execute("ALTER TABLE polls DROP COLUMN IF EXISTS closed_at")
+    op.execute("ALTER TABLE polls DROP COLUMN IF EXISTS closes_at")
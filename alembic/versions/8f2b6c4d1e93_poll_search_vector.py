@@ -0,0 +1,41 @@
+"""poll search vector
+
+Revision ID: 8f2b6c4d1e93
+Revises: 3c1d9a7e5b20
+Create Date: 2026-10-19 14:37:05.902215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2b6c4d1e93'
+down_revision: Union[str, Sequence[str], None] = '3c1d9a7e5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # generated column keeps the vector in sync on every insert/update;
+    # title matches (weight A) rank above description matches (weight B)
+    op.execute("""
+        ALTER TABLE polls ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_polls_search_vector ON polls USING GIN (search_vector)")
+    # search ranks the most recent matches of broad terms, walked in this order
+    op.execute("CREATE INDEX IF NOT EXISTS ix_polls_recent ON polls (created_at DESC, id DESC) WHERE deleted_at IS NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_polls_recent")
+    op.execute("DROP INDEX IF EXISTS ix_polls_search_vector")
+    op.execute("ALTER TABLE polls DROP COLUMN IF EXISTS search_vector")
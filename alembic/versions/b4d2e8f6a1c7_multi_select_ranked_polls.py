@@ -0,0 +1,57 @@
+"""multi-select and ranked-choice polls
+
+Revision ID: b4d2e8f6a1c7
+Revises: 5a7e0c3b9d41
+Create Date: 2026-10-19 18:41:05.112904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d2e8f6a1c7'
+down_revision: Union[str, Sequence[str], None] = '5a7e0c3b9d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # tables are also created by Base.metadata.create_all, so guard with IF NOT EXISTS
+    op.execute("ALTER TABLE polls ADD COLUMN IF NOT EXISTS voting_method VARCHAR(16) NOT NULL DEFAULT 'single'")
+    op.execute("ALTER TABLE polls ADD COLUMN IF NOT EXISTS max_choices INTEGER")
+    op.execute("ALTER TABLE poll_results ADD COLUMN IF NOT EXISTS rounds JSON")
+
+    # existing options are numbered in id order, as nothing depends on it yet
+    op.execute("ALTER TABLE options ADD COLUMN IF NOT EXISTS position SMALLINT")
+    op.execute("""
+        UPDATE options SET position = numbered.position
+        FROM (
+            SELECT id, row_number() OVER (PARTITION BY poll_id ORDER BY id) - 1 AS position
+            FROM options
+        ) AS numbered
+        WHERE options.id = numbered.id AND options.position IS NULL
+    """)
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS ballots (
+            id UUID PRIMARY KEY,
+            poll_id UUID NOT NULL REFERENCES polls (id) ON DELETE CASCADE,
+            user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            choices SMALLINT[] NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT uq_ballots_poll_user UNIQUE (poll_id, user_id)
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS ballots")
+    op.execute("ALTER TABLE options DROP COLUMN IF EXISTS position")
+    op.execute("ALTER TABLE poll_results DROP COLUMN IF EXISTS rounds")
+    op.execute("ALTER TABLE polls DROP COLUMN IF EXISTS max_choices")
+    op.execute("ALTER TABLE polls DROP COLUMN IF EXISTS voting_method")
@@ -9,29 +9,53 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))          # number of persistent connections
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))   # extra connections for bursts
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
 
 
+# SQLAlchemy Engine instance, created by init_db() in the app lifespan
+engine = None
 
-# it creates a SQLAlchemy Engine instance
-engine = create_engine(
-    DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=5,          # number of persistent connections
-    max_overflow=10,      # extra connections for bursts
-    pool_timeout=30,
-    pool_recycle=1800,
-    
-)
-
-# it is a factory for new Session objects
-sessionlocal = sessionmaker(autocommit=False , autoflush=False, bind=engine)
+# it is a factory for new Session objects, bound to the engine in init_db()
+sessionlocal = sessionmaker(autocommit=False , autoflush=False)
 
 # it is a base class for our models
 Base = declarative_base()
 
 
+def init_db():
+    """Create the engine, create missing tables and open the pooled connections."""
+    global engine
+    if not DATABASE_URL:
+        raise ValueError("DATABASE_URL environment variable is not set")
+
+    engine = create_engine(
+        DATABASE_URL,
+        poolclass=QueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=1800,
+    )
+    sessionlocal.configure(bind=engine)
+
+    from app import models  # registers the tables on Base
+    Base.metadata.create_all(bind=engine)
+
+    # check out every persistent connection once so the first requests skip the connect cost
+    connections = [engine.connect() for _ in range(DB_POOL_SIZE)]
+    for connection in connections:
+        connection.close()
+
+
+def dispose_db():
+    global engine
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
+
 # Creates one session per request
 # Session is yielded into path operation function
 # Session is closed after request ends
@@ -43,13 +67,6 @@ def get_db():
         db.close()
 
 
-Base.metadata.create_all(bind=engine)
-
-
 import os
 
 REDIS_ENABLED = os.getenv("REDIS_ENABLED", "false").lower() == "true"
-
-from app.models import Vote, Poll, User, Like , Option
-
-Base.metadata.create_all(bind=engine)
@@ -0,0 +1,31 @@
+# app/gateway.py
+# WebSocket-only entry point, run as its own process next to the REST API:
+#   uvicorn app.gateway:app --port 8001
+# It has no database: join snapshots and updates come from Redis alone.
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from app.routes import ws
+from app.redis_pool import REDIS_URL, init_redis, close_redis
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not REDIS_URL:
+        raise RuntimeError("The WebSocket gateway needs REDIS_URL")
+    await init_redis()
+    yield
+    await ws.event_hub.close()
+    await close_redis()
+
+
+# no middleware and no OpenAPI routes, sockets are the only traffic
+app = FastAPI(title="PollNinja WebSocket Gateway", lifespan=lifespan, openapi_url=None, docs_url=None, redoc_url=None)
+app.include_router(ws.routers)
+# join snapshots come from the poll state stored in Redis
+app.state.snapshots_from_database = False
+
+
+@app.get("/health")
+def health():
+    # WebSocket and SSE subscribers share the hub; the gateway only has sockets
+    return {"status": "ok", "connections": ws.event_hub.subscriber_count()}
@@ -1,10 +1,45 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import polls, ws , votes , likes , auth
-from app.routes.ws import redis_client 
-from app.routes.ws import redis_url
+from fastapi.middleware.gzip import GZipMiddleware
+from app.routes import polls, ws , votes , likes , auth , events , admin
+from app import db as database
+from app.db import init_db, dispose_db
+from app.redis_pool import init_redis, close_redis
+from app.utils.compression import COMPRESSION_MIN_SIZE
+from app.utils.partitions import maintain_partitions_forever
+from app.utils.closing import close_due_polls_forever
+from app.utils import profiling
 
-app = FastAPI(title="PollNinja Backend")
+
+# set to false when WebSockets are served by the separate gateway (app/gateway.py)
+SERVE_WEBSOCKETS = os.getenv("SERVE_WEBSOCKETS", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # connection pools are created and warmed before the first request
+    await run_in_threadpool(init_db)
+    if profiling.PROFILING_ENABLED:
+        profiling.install(database.engine)
+    await init_redis()
+    # creates upcoming vote partitions now and then periodically
+    partitioner = asyncio.create_task(maintain_partitions_forever())
+    # freezes the results of polls whose closes_at has passed
+    closer = asyncio.create_task(close_due_polls_forever(on_closed=ws.broadcast_poll_closed))
+    yield
+    closer.cancel()
+    partitioner.cancel()
+    # end pub/sub readers and subscriber streams before closing the pools
+    await ws.event_hub.close()
+    await close_redis()
+    await run_in_threadpool(dispose_db)
+
+
+app = FastAPI(title="PollNinja Backend", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -15,11 +50,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip for responses that are not already compressed; cached poll snapshots
+# set Content-Encoding themselves and are passed through untouched
+app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# outermost, so its timings include compression; not installed at all when off
+if profiling.PROFILING_ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
+
+# registered before polls so /events is not captured by /{poll_id}
+app.include_router(events.routers, prefix="/api/polls")
 app.include_router(polls.routers, prefix="/api/polls", tags=["Polls"])
 app.include_router(votes.routers, prefix="/api/votes", tags=["Votes"])
 app.include_router(likes.router, prefix="/api/likes", tags=["Likes"])
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
-app.include_router(ws.routers)
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+if SERVE_WEBSOCKETS:
+    app.include_router(ws.routers)
 
 @app.get("/")
 def root():
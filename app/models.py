@@ -1,6 +1,6 @@
 from fastapi import FastAPI 
-from sqlalchemy import Column, Integer, String , DateTime , Text , ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, SmallInteger, String , DateTime , Text , ForeignKey, JSON, UniqueConstraint
+from sqlalchemy.dialects.postgresql import UUID, ARRAY
 import uuid
 from app.db import Base
 from sqlalchemy.orm import relationship
@@ -39,10 +39,24 @@ class Poll(Base):
     )
     likes_count = Column(Integer, default=0)  
     created_by = Column(String , nullable=False) #change later for FK to users
+    # "single" uses votes; "multi" and "ranked" use ballots
+    voting_method = Column(String(16), nullable=False, default="single", server_default="single")
+    max_choices = Column(Integer, nullable=True)
+    # set on delete; rows are removed later by the background purger
+    deleted_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    # voting stops at closes_at; closed_at is set once the results are frozen
+    closes_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    # Postgres also has a generated search_vector tsvector column (see the
+    # poll_search_vector migration); it is left off the model on purpose
 
-    options = relationship("Option" , back_populates="poll" , cascade="all, delete-orphan")
-    votes = relationship("Vote" , back_populates="poll" , cascade="all, delete-orphan")
-    likes = relationship("Like" , back_populates="poll" , cascade="all, delete-orphan")
+    # passive_deletes lets the database ON DELETE CASCADE remove children
+    # instead of SQLAlchemy loading every vote and like into memory first
+    options = relationship("Option" , back_populates="poll" , cascade="all, delete-orphan", passive_deletes=True)
+    votes = relationship("Vote" , back_populates="poll" , cascade="all, delete-orphan", passive_deletes=True)
+    likes = relationship("Like" , back_populates="poll" , cascade="all, delete-orphan", passive_deletes=True)
+    ballots = relationship("Ballot" , back_populates="poll" , cascade="all, delete-orphan", passive_deletes=True)
+    result = relationship("PollResult" , back_populates="poll" , uselist=False, passive_deletes=True)
 
 class Option(Base):
     __tablename__ = "options"
@@ -50,12 +64,16 @@ class Option(Base):
     id = Column(UUID(as_uuid=True) , primary_key= True , default=uuid.uuid4 )
     poll_id = Column(UUID(as_uuid=True) , ForeignKey("polls.id" , ondelete="CASCADE") , nullable=False)
     text = Column(Text , nullable=False)
+    # index of the option within its poll, as stored in ballots
+    position = Column(SmallInteger , nullable=True)
     
     poll = relationship("Poll" , back_populates="options")
-    votes = relationship("Vote" , back_populates="option" , cascade="all, delete-orphan")
+    votes = relationship("Vote" , back_populates="option" , cascade="all, delete-orphan", passive_deletes=True)
    
 class Vote(Base):
     __tablename__ = "votes"
+    # on Postgres the table is partitioned by month of created_at and its
+    # primary key is (id, created_at); see app/utils/partitions.py
 
     id = Column(UUID(as_uuid=True) , primary_key= True , default=uuid.uuid4 )
     poll_id = Column(UUID(as_uuid=True) , ForeignKey("polls.id" , ondelete="CASCADE") , nullable=False)
@@ -85,4 +103,38 @@ class Like(Base):
     )
 
     poll = relationship("Poll" , back_populates="likes")
-    user = relationship("User" , back_populates="likes")
\ No newline at end of file
+    user = relationship("User" , back_populates="likes")
+
+
+class PollResult(Base):
+    """Final tallies of a closed poll, written once and never updated."""
+    __tablename__ = "poll_results"
+
+    poll_id = Column(UUID(as_uuid=True) , ForeignKey("polls.id" , ondelete="CASCADE") , primary_key=True)
+    closed_at = Column(DateTime(timezone=True), nullable=False)
+    total_votes = Column(Integer, nullable=False, default=0)
+    # option id (string) -> vote count
+    tallies = Column(JSON, nullable=False)
+    # instant-runoff rounds of ranked polls
+    rounds = Column(JSON, nullable=True)
+
+    poll = relationship("Poll" , back_populates="result")
+
+
+class Ballot(Base):
+    """One user's choices in a multi-select or ranked-choice poll."""
+    __tablename__ = "ballots"
+    __table_args__ = (UniqueConstraint("poll_id", "user_id", name="uq_ballots_poll_user"),)
+
+    id = Column(UUID(as_uuid=True) , primary_key= True , default=uuid.uuid4 )
+    poll_id = Column(UUID(as_uuid=True) , ForeignKey("polls.id" , ondelete="CASCADE") , nullable=False)
+    user_id = Column(UUID(as_uuid=True) , ForeignKey("users.id" , ondelete="CASCADE") , nullable=False)
+    # option positions, in order of preference for ranked polls
+    choices = Column(ARRAY(SmallInteger) , nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False
+    )
+
+    poll = relationship("Poll" , back_populates="ballots")
@@ -0,0 +1,163 @@
+import os
+import time
+import asyncio
+from typing import Optional
+import redis.asyncio as redis
+from redis.asyncio import Redis
+from dotenv import load_dotenv
+from app.utils.profiling import span
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_WARM_CONNECTIONS = int(os.getenv("REDIS_WARM_CONNECTIONS", "5"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "2"))
+
+# failures inside this window trip the breaker
+BREAKER_FAILURE_THRESHOLD = 3
+BREAKER_FAILURE_WINDOW = 10
+# background probe backoff while the breaker is open
+BREAKER_PROBE_INTERVAL = 1
+BREAKER_MAX_PROBE_INTERVAL = 30
+
+
+class CircuitBreaker:
+    """Fails fast while Redis is unhealthy and probes it in the background.
+
+    While open, get_redis() returns None immediately so callers use their
+    local fallback instead of waiting on connection timeouts.
+    """
+
+    def __init__(self, probe):
+        self.probe = probe
+        self.is_open = False
+        self.on_recover = []
+        self._failures = 0
+        self._window_start = 0.0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def record_success(self):
+        self._failures = 0
+
+    def record_failure(self, error: Exception = None):
+        if self.is_open:
+            return
+        now = time.monotonic()
+        if now - self._window_start > BREAKER_FAILURE_WINDOW:
+            self._window_start = now
+            self._failures = 0
+        self._failures += 1
+        if self._failures >= BREAKER_FAILURE_THRESHOLD:
+            self.trip(error)
+
+    def trip(self, error: Exception = None):
+        if self.is_open:
+            return
+        print(f"Redis circuit opened: {error}")
+        self.is_open = True
+        self._probe_task = asyncio.get_running_loop().create_task(self._probe_until_healthy())
+
+    async def _probe_until_healthy(self):
+        delay = BREAKER_PROBE_INTERVAL
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await asyncio.wait_for(self.probe(), REDIS_SOCKET_TIMEOUT)
+            except Exception:
+                delay = min(delay * 2, BREAKER_MAX_PROBE_INTERVAL)
+                continue
+            break
+
+        self.is_open = False
+        self._failures = 0
+        print("Redis circuit closed")
+        for callback in self.on_recover:
+            try:
+                await callback()
+            except Exception as e:
+                print(f"Redis recovery callback failed: {e}")
+
+    async def close(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._probe_task = None
+
+
+redis_client: Optional[Redis] = None
+
+
+async def _ping():
+    await redis_client.ping()
+
+
+breaker = CircuitBreaker(_ping)
+
+
+# Redis Setup
+async def init_redis():
+    """Create the connection pool and open connections ahead of the first request."""
+    global redis_client
+    if not REDIS_URL:
+        print("REDIS_URL is not set, updates reach this instance's subscribers only")
+        return
+
+    pool = redis.ConnectionPool.from_url(
+        REDIS_URL,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        health_check_interval=30,
+        encoding="utf-8",
+        decode_responses=True,
+    )
+    redis_client = Redis(connection_pool=pool)
+
+    try:
+        # concurrent pings each check out their own connection, warming the pool
+        await asyncio.gather(*(_ping() for _ in range(REDIS_WARM_CONNECTIONS)))
+        print("Connected to Redis")
+    except Exception as e:
+        print(f"Failed to connect to Redis: {e}")
+        breaker.trip(e)
+
+
+async def close_redis():
+    global redis_client
+    await breaker.close()
+    if redis_client is not None:
+        await redis_client.aclose()
+        await redis_client.connection_pool.disconnect()
+        redis_client = None
+
+
+async def get_redis() -> Optional[Redis]:
+    # None while Redis is not configured or the circuit is open
+    if redis_client is None or breaker.is_open:
+        return None
+    return redis_client
+
+
+def record_failure(error: Exception):
+    breaker.record_failure(error)
+
+
+async def publish(channel: str, message: str) -> bool:
+    """Publish to a channel; returns False if Redis is unavailable."""
+    redis_conn = await get_redis()
+    if not redis_conn:
+        return False
+    try:
+        with span("redis.publish"):
+            await redis_conn.publish(channel, message)
+    except Exception as e:
+        print(f"Failed to publish to {channel}: {e}")
+        breaker.record_failure(e)
+        return False
+    breaker.record_success()
+    return True
@@ -0,0 +1,71 @@
+# app/routes/admin.py
+import os
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse, FileResponse, HTMLResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from app.utils.dependencies import check_admin_role
+from app.utils import export
+from app.utils import profiling
+
+
+# every admin endpoint requires the admin role
+router = APIRouter(dependencies=[Depends(check_admin_role)])
+
+
+# Export votes, likes or options as Arrow IPC (streamed) or Parquet
+@router.get("/export/{table}")
+async def export_table(
+    table: str,
+    format: str = Query("arrow", pattern="^(arrow|parquet)$"),
+    chunk_size: int = Query(export.EXPORT_CHUNK_SIZE, ge=1000, le=1_000_000),
+):
+    if table not in export.EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail="Unknown table")
+    if not export.available():
+        raise HTTPException(status_code=501, detail="pyarrow is not installed")
+
+    media_type, extension = export.FORMATS[format]
+    filename = f"{table}.{extension}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+    if format == "arrow":
+        # record batches are written to the response as they come off the cursor
+        return StreamingResponse(export.stream_arrow_ipc(table, chunk_size), media_type=media_type, headers=headers)
+
+    # Parquet needs a seekable file for its footer, so write to a temp file first
+    fd, path = tempfile.mkstemp(suffix=f".{extension}")
+    os.close(fd)
+    try:
+        await run_in_threadpool(export.write_export, table, path, format, chunk_size)
+    except Exception:
+        os.unlink(path)
+        raise
+    return FileResponse(path, media_type=media_type, filename=filename, background=BackgroundTask(os.unlink, path))
+
+
+# Recent profiled and slow requests, newest first
+@router.get("/profiles")
+def list_profiles():
+    return [record.summary() for record in reversed(profiling.profiles)]
+
+
+# SQL breakdown, spans and sampling profile of one request
+@router.get("/profiles/{profile_id}")
+def get_profile(profile_id: str, format: str = Query("json", pattern="^(json|html)$")):
+    record = profiling.find(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "html":
+        html = profiling.render(record, "html")
+        if html is None:
+            raise HTTPException(status_code=404, detail="No sampling profile for this request")
+        return HTMLResponse(html)
+    return record.detail()
+
+
+# Recent queries slower than SLOW_QUERY_MS, newest first
+@router.get("/slow-queries")
+def list_slow_queries():
+    return list(reversed(profiling.slow_queries))
@@ -0,0 +1,83 @@
+# app/routes/events.py
+import asyncio
+from typing import Optional
+from uuid import UUID
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from app.routes.ws import event_hub, poll_snapshot
+
+
+routers = APIRouter(tags=["Events"])
+
+# comment line sent when idle so proxies keep the stream open
+HEARTBEAT_INTERVAL = 15
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+async def _event_stream(channel: str, last_event_id: Optional[str], snapshot=None):
+    queue = await event_hub.subscribe(channel)
+    try:
+        yield b"retry: 3000\n\n"
+
+        # ids from before a restart or from another instance, or older than
+        # the replay buffer covers, cannot be resumed here; those clients
+        # start over from the current state
+        resume_from = event_hub.parse_event_id(last_event_id)
+        replayed = event_hub.replay(channel, resume_from) if resume_from is not None else None
+        # highest id delivered from the replay buffer; queued copies are skipped
+        sent = 0
+        if replayed is not None:
+            for event in replayed:
+                sent = event.id
+                yield event.sse
+        elif snapshot is not None:
+            for event in await snapshot() or []:
+                yield event.sse
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if event is None:
+                # dropped for falling behind, the client reconnects and resumes
+                break
+            if event.id <= sent:
+                # already delivered from the replay buffer
+                continue
+            sent = event.id
+            yield event.sse
+    finally:
+        event_hub.unsubscribe(channel, queue)
+
+
+# Global event stream (new polls, deletions, vote/like updates)
+@routers.get("/events")
+async def stream_all_polls(last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")):
+    return StreamingResponse(
+        _event_stream("polls:global", last_event_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
+# Per-poll event stream (vote/like updates)
+@routers.get("/{poll_id}/events")
+async def stream_poll_updates(poll_id: UUID, last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")):
+    # the stream itself holds no DB connection, the snapshot is cached
+    if await poll_snapshot(str(poll_id)) is None:
+        raise HTTPException(status_code=404, detail="Poll not found")
+
+    return StreamingResponse(
+        _event_stream(
+            f"poll:{poll_id}",
+            last_event_id,
+            snapshot=lambda: poll_snapshot(str(poll_id)),
+        ),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
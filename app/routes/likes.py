@@ -1,11 +1,14 @@
 # app/routes/likes.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
 from sqlalchemy.orm import Session
 from uuid import uuid4
 from app.db import get_db
 from app import models
 from app.utils.dependencies import get_current_user
 from app.routes.ws import broadcast_like_update
+from app.utils import idempotency
+from app.utils import snapshot_cache
+from typing import Optional
 
 router = APIRouter(tags=["Likes"])
 
@@ -13,41 +16,59 @@ router = APIRouter(tags=["Likes"])
 @router.post("/{poll_id}", response_model=dict)
 async def toggle_like(
     poll_id: str,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
-    poll = db.query(models.Poll).filter(models.Poll.id == poll_id).first()
-    if not poll:
-        raise HTTPException(status_code=404, detail="Poll not found")
+    # a retried toggle must not flip the like back, so replay the first result
+    request_hash = idempotency.fingerprint({"poll_id": poll_id})
+    replay = await idempotency.begin("toggle_like", current_user.id, idempotency_key, request_hash)
+    if replay is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return replay
 
-    existing_like = (
-        db.query(models.Like)
-        .filter(models.Like.poll_id == poll_id, models.Like.user_id == current_user.id)
-        .first()
-    )
+    try:
+        poll = db.query(models.Poll).filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None)).first()
+        if not poll:
+            raise HTTPException(status_code=404, detail="Poll not found")
+
+        existing_like = (
+            db.query(models.Like)
+            .filter(models.Like.poll_id == poll_id, models.Like.user_id == current_user.id)
+            .first()
+        )
 
-    if existing_like:
-        db.delete(existing_like)
-        # decrement likes_count safely
-        current = int(poll.likes_count) if poll.likes_count is not None else 0
-        poll.likes_count = max(0, current - 1)
-        like_status = False
-    else:
-        new_like = models.Like(id=str(uuid4()), poll_id=poll_id, user_id=current_user.id)
-        db.add(new_like)
-        current = int(poll.likes_count) if poll.likes_count is not None else 0
-        poll.likes_count = current + 1
-        like_status = True
-
-    db.commit()
-    db.refresh(poll)
+        if existing_like:
+            db.delete(existing_like)
+            # decrement likes_count safely
+            current = int(poll.likes_count) if poll.likes_count is not None else 0
+            poll.likes_count = max(0, current - 1)
+            like_status = False
+        else:
+            new_like = models.Like(id=str(uuid4()), poll_id=poll_id, user_id=current_user.id)
+            db.add(new_like)
+            current = int(poll.likes_count) if poll.likes_count is not None else 0
+            poll.likes_count = current + 1
+            like_status = True
+
+        db.commit()
+        db.refresh(poll)
+    except Exception:
+        db.rollback()
+        await idempotency.release("toggle_like", current_user.id, idempotency_key)
+        raise
+
+    result = {"liked": like_status, "likes": poll.likes_count}
+    await idempotency.complete("toggle_like", current_user.id, idempotency_key, request_hash, result)
+    await snapshot_cache.invalidate(poll_id)
 
     try:
         await broadcast_like_update(poll_id)
     except Exception as e:
         print(f"WS broadcast error: {e}")
 
-    return {"liked": like_status, "likes": poll.likes_count}
+    return result
 
 
 @router.get("/user/{poll_id}", response_model=dict)
@@ -58,7 +79,7 @@ def get_user_like(
 ):
     liked = db.query(models.Like).filter(models.Like.poll_id == poll_id, models.Like.user_id == current_user.id).first() is not None
 
-    poll = db.query(models.Poll).filter(models.Poll.id == poll_id).first()
+    poll = db.query(models.Poll).filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None)).first()
     likes_count = poll.likes_count if poll else 0
 
     return {"liked": liked, "likes": likes_count}
@@ -70,5 +91,10 @@ def get_all_user_likes(
     current_user: models.User = Depends(get_current_user),
 ):
     """Get all user's likes across all polls in one request."""
-    likes = db.query(models.Like).filter(models.Like.user_id == current_user.id).all()
+    likes = (
+        db.query(models.Like)
+        .join(models.Poll)
+        .filter(models.Like.user_id == current_user.id, models.Poll.deleted_at.is_(None))
+        .all()
+    )
     return {str(like.poll_id): True for like in likes}
@@ -1,70 +1,127 @@
-from fastapi import APIRouter , HTTPException, Depends
+from fastapi import APIRouter , HTTPException, Depends, BackgroundTasks, Header, Query, Request, Response
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
-from app.db import get_db
+from sqlalchemy import insert
+from sqlalchemy.sql import func
+from app.db import get_db, sessionlocal
 from app.schema import PollCreate, Poll, PollBase 
 from app import models , schema
 from app.utils.dependencies import get_current_user
 from datetime import datetime
 from app.utils.dependencies import check_admin_role
 from uuid import UUID
+from typing import Optional
+import uuid
 
 import asyncio
 import json
 
-from app.routes.ws import get_redis
+from app.redis_pool import publish
+from app.utils.purge import purge_poll
+from app.routes.ws import broadcast_poll_closed, send_local
+from app.utils import idempotency
+from app.utils import snapshot_cache
+from app.utils import search
+from app.utils import closing
+from app.utils import poll_state
+from app.utils import tally
 
 
 routers = APIRouter()
 
+_poll_adapter = TypeAdapter(schema.Poll)
+_poll_list_adapter = TypeAdapter(list[schema.Poll])
+
 #Create a poll 
 @routers.post("/", response_model=schema.Poll)
 async def create_poll(poll: schema.PollCreate ,  
+                    response: Response,
                     db: Session = Depends(get_db),  
                     admin_user: models.User = Depends(get_current_user),
+                    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
                     ):
-    db_poll = models.Poll(title=poll.title, description=poll.description , likes_count=0, created_by=admin_user.username)
-    db.add(db_poll)
-    db.commit()
-    db.refresh(db_poll)
-
-    # for each option in the poll, create an Option object and associate it with the poll
-    for option in poll.options:
-        db_option = models.Option(text=option.text, poll_id=db_poll.id)
-        db.add(db_option)
-    
-    db.commit()
-    db.refresh(db_poll)
+    request_hash = idempotency.fingerprint(poll.model_dump())
+    replay = await idempotency.begin("create_poll", admin_user.id, idempotency_key, request_hash)
+    if replay is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return replay
+
+    closes_at = closing.as_utc(poll.closes_at) if poll.closes_at else None
+    if closes_at is not None and closes_at <= closing.utcnow():
+        await idempotency.release("create_poll", admin_user.id, idempotency_key)
+        raise HTTPException(status_code=400, detail="closes_at must be in the future")
+    if poll.max_choices is not None and (poll.voting_method == "single" or poll.max_choices > len(poll.options)):
+        await idempotency.release("create_poll", admin_user.id, idempotency_key)
+        raise HTTPException(status_code=400, detail="max_choices must be between 1 and the number of options of a multi or ranked poll")
+
+    # poll and options go in one transaction: one INSERT ... RETURNING for the
+    # poll and a single multi-row INSERT for the options
+    poll_id = uuid.uuid4()
+    option_rows = [{"id": uuid.uuid4(), "poll_id": poll_id, "text": option.text, "position": i} for i, option in enumerate(poll.options)]
+    try:
+        created_at = db.execute(
+            insert(models.Poll)
+            .values(id=poll_id, title=poll.title, description=poll.description, likes_count=0, created_by=admin_user.username, closes_at=closes_at,
+                    voting_method=poll.voting_method, max_choices=poll.max_choices)
+            .returning(models.Poll.created_at)
+        ).scalar_one()
+        if option_rows:
+            db.execute(insert(models.Option).values(option_rows))
+        db.commit()
+    except Exception:
+        db.rollback()
+        await idempotency.release("create_poll", admin_user.id, idempotency_key)
+        raise
 
     poll_data = {
         "type": "new_poll",
-        "id": str(db_poll.id),
-        "title": db_poll.title,
-        "description": db_poll.description,
-        "created_at": db_poll.created_at.isoformat() if isinstance(db_poll.created_at, datetime) else str(db_poll.created_at),
-        "created_by": db_poll.created_by,
-        "likes_count": db_poll.likes_count or 0,
-        "likes": db_poll.likes_count or 0,
+        "id": str(poll_id),
+        "title": poll.title,
+        "description": poll.description,
+        "created_at": created_at.isoformat() if isinstance(created_at, datetime) else str(created_at),
+        "created_by": admin_user.username,
+        "closes_at": closes_at.isoformat() if closes_at else None,
+        "closed_at": None,
+        "voting_method": poll.voting_method,
+        "max_choices": poll.max_choices,
+        "likes_count": 0,
+        "likes": 0,
         "options": [
-            {"id": str(o.id), "poll_id": str(o.poll_id), "text": o.text, "votes": 0}
-            for o in db_poll.options
+            {"id": str(o["id"]), "poll_id": str(poll_id), "text": o["text"], "votes": 0}
+            for o in option_rows
         ],
     }
 
+    await idempotency.complete("create_poll", admin_user.id, idempotency_key, request_hash, poll_data)
+    await snapshot_cache.invalidate()
+    if search.fallback_index.built:
+        search.fallback_index.add(poll_id, poll.title, poll.description, created_at, admin_user.username)
+
+    # initial join snapshot for the WebSocket gateway
+    await poll_state.save(
+        poll_id,
+        await snapshot_cache.poll_version(poll_id),
+        {"type": "vote_update", "poll_id": str(poll_id), "options": [{"option_id": str(o["id"]), "text": o["text"], "votes": 0} for o in option_rows]},
+        {"type": "like_update", "poll_id": str(poll_id), "likes": 0},
+    )
 
     #  Broadcast to global WS channel
-    redis_conn = await get_redis()
-    if redis_conn:
-        await redis_conn.publish("polls:global", json.dumps(poll_data , default=str))
+    data = json.dumps(poll_data , default=str)
+    if not await publish("polls:global", data):
+        await send_local(None, poll_data, data)
     return poll_data
 
 
 
 # Delete a poll
 @routers.delete("/{poll_id}")
-async def delete_poll(poll_id: UUID, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def delete_poll(poll_id: UUID,
+                      background_tasks: BackgroundTasks,
+                      db: Session = Depends(get_db),
+                      current_user: models.User = Depends(get_current_user)):
 
     #find poll
-    db_poll = db.query(models.Poll).filter(models.Poll.id == poll_id).first()
+    db_poll = db.query(models.Poll).filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None)).first()
     if not db_poll:
         raise HTTPException(status_code=404, detail="Poll not found")
     
@@ -73,13 +130,15 @@ async def delete_poll(poll_id: UUID, db: Session = Depends(get_db), current_user
     if str(db_poll.created_by) != current_user.username:
         raise HTTPException(status_code=403, detail="Not authorized to delete this poll")
     
-    #Delete related options first
-    db.query(models.Option).filter(models.Option.poll_id == poll_id).delete()
-
-    # delete the poll 
-    db.delete(db_poll)
+    # soft delete: hide the poll now, purge its rows in the background
+    db_poll.deleted_at = func.now()
     db.commit()
 
+    background_tasks.add_task(purge_poll, poll_id)
+    await snapshot_cache.invalidate(poll_id)
+    search.fallback_index.remove(poll_id)
+    tally.forget(poll_id)
+    await poll_state.clear(poll_id)
 
 
     # Notify via WebSocket
@@ -88,28 +147,65 @@ async def delete_poll(poll_id: UUID, db: Session = Depends(get_db), current_user
         "poll_id": str(poll_id),
     }
 
-    redis_conn = await get_redis()
-    if redis_conn:
-        await redis_conn.publish("polls:global", json.dumps(poll_data , default=str))
+    data = json.dumps(poll_data , default=str)
+    if not await publish("polls:global", data):
+        await send_local(None, poll_data, data)
 
     return {"message": "Poll deleted successfully", "poll_id": poll_id}
 
 
-# Get All Polls (with votes)
-@routers.get("/", response_model=list[schema.Poll])
-def list_polls(db: Session = Depends(get_db)):
-    polls = db.query(models.Poll).order_by(models.Poll.created_at.desc()).all()
+# Close a poll: stop voting and freeze the final tallies
+@routers.post("/{poll_id}/close", response_model=schema.PollResults)
+async def close_poll(poll_id: UUID,
+                     db: Session = Depends(get_db),
+                     current_user: models.User = Depends(get_current_user)):
+    db_poll = db.query(models.Poll.created_by).filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None)).first()
+    if not db_poll:
+        raise HTTPException(status_code=404, detail="Poll not found")
+
+    if str(db_poll.created_by) != current_user.username:
+        raise HTTPException(status_code=403, detail="Not authorized to close this poll")
+
+    # closing twice returns the results frozen the first time; only the
+    # request that froze them (not a concurrent one or the sweep) announces it
+    results, frozen = closing.freeze_results(db, poll_id)
+    if results is None:
+        # purged between the check above and the lock
+        raise HTTPException(status_code=404, detail="Poll not found")
+    if frozen:
+        await broadcast_poll_closed(results)
+    return results
+
+
+def _options_data(db: Session, poll: models.Poll):
+    # closed polls read their frozen tallies and never touch votes
+    tallies = poll.result.tallies if poll.closed_at is not None and poll.result is not None else None
+    # open ballot polls: approvals or first choices, by option position
+    preferences = None
+    if tallies is None and poll.voting_method != "single":
+        preferences = tally.preference_counts(db, poll.id, poll.voting_method)
+    options_data = []
+    for option in poll.options:
+        if tallies is not None:
+            votes_count = tallies.get(str(option.id), 0)
+        elif preferences is not None:
+            votes_count = preferences.get(option.position, 0)
+        else:
+            votes_count = db.query(models.Vote).filter(models.Vote.option_id == option.id).count()
+        options_data.append({
+            "id": str(option.id),
+            "poll_id": str(option.poll_id),
+            "text": option.text,
+            "votes": votes_count,
+        })
+    return options_data
+
+
+def _list_polls_data(db: Session):
+    polls = db.query(models.Poll).filter(models.Poll.deleted_at.is_(None)).order_by(models.Poll.created_at.desc()).all()
     result = []
     for poll in polls:
-        options_data = []
-        for option in poll.options:
-            votes_count = db.query(models.Vote).filter(models.Vote.option_id == option.id).count()
-            options_data.append({
-                "id": str(option.id),
-                "poll_id": str(option.poll_id),
-                "text": option.text,
-                "votes": votes_count,
-            })
+        options_data = _options_data(db, poll)
 
         like_count = db.query(models.Like).filter(models.Like.poll_id == poll.id).count()
 
@@ -119,6 +215,10 @@ def list_polls(db: Session = Depends(get_db)):
             "description": poll.description,
             "created_at": poll.created_at,
             "created_by": poll.created_by,
+            "closes_at": poll.closes_at,
+            "closed_at": poll.closed_at,
+            "voting_method": poll.voting_method,
+            "max_choices": poll.max_choices,
             "likes_count": like_count,
             "likes": like_count,
             "options": options_data,
@@ -129,22 +229,12 @@ def list_polls(db: Session = Depends(get_db)):
     return result
 
 
-# Get polls (with votes)
-@routers.get("/{poll_id}", response_model=schema.Poll)
-def get_polls(poll_id: str, db: Session = Depends(get_db)):
-    poll = db.query(models.Poll).filter(models.Poll.id == poll_id).first()
+def _poll_data(db: Session, poll_id: str):
+    poll = db.query(models.Poll).filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None)).first()
     if not poll:
         raise HTTPException(status_code=404, detail="Poll not found")
 
-    options_data = []
-    for option in poll.options:
-        votes_count = db.query(models.Vote).filter(models.Vote.option_id == option.id).count()
-        options_data.append({
-            "id": str(option.id),
-            "poll_id": str(option.poll_id),
-            "text": option.text,
-            "votes": votes_count,
-        })
+    options_data = _options_data(db, poll)
 
     like_count = db.query(models.Like).filter(models.Like.poll_id == poll.id).count()
 
@@ -154,9 +244,91 @@ def get_polls(poll_id: str, db: Session = Depends(get_db)):
         "description": poll.description,
         "created_at": poll.created_at,
         "created_by": poll.created_by,
+        "closes_at": poll.closes_at,
+        "closed_at": poll.closed_at,
+        "voting_method": poll.voting_method,
+        "max_choices": poll.max_choices,
         "likes_count": like_count,
         "likes": like_count,
         "options": options_data,
     }
 
-    return poll_data
\ No newline at end of file
+    return poll_data
+
+
+# Get All Polls (with votes)
+@routers.get("/", response_model=list[schema.Poll])
+async def list_polls(request: Request):
+    # rendered JSON (and its gzip/br variants) is cached until the next write
+    def build():
+        # the build is shared by concurrent requests and may outlive this one,
+        # so it uses its own session rather than the request's
+        db = sessionlocal()
+        try:
+            return _poll_list_adapter.dump_json(_poll_list_adapter.validate_python(_list_polls_data(db)), by_alias=True)
+        finally:
+            db.close()
+
+    body = await snapshot_cache.get_or_build("polls:list", build)
+    return body.to_response(request.headers.get("accept-encoding"))
+
+
+# Search polls by title and description; declared before /{poll_id}
+@routers.get("/search", response_model=schema.PollSearchPage)
+def search_polls(q: str = Query(..., min_length=1, max_length=256),
+                 limit: int = Query(search.SEARCH_DEFAULT_LIMIT, ge=1, le=search.SEARCH_MAX_LIMIT),
+                 cursor: Optional[str] = None,
+                 db: Session = Depends(get_db)):
+    return search.search_polls(db, q, limit, cursor)
+
+
+# Full results: counts per option, and the instant-runoff rounds of ranked polls
+@routers.get("/{poll_id}/results", response_model=schema.PollTally)
+async def poll_results(poll_id: UUID, db: Session = Depends(get_db)):
+    poll = db.query(models.Poll).filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None)).first()
+    if not poll:
+        raise HTTPException(status_code=404, detail="Poll not found")
+
+    if poll.closed_at is not None and poll.result is not None:
+        results = {
+            "total_ballots": poll.result.total_votes,
+            "tallies": poll.result.tallies,
+            "rounds": poll.result.rounds,
+            "winner": tally.runoff_winner(poll.result.rounds),
+        }
+    elif poll.voting_method == "single":
+        counts = (
+            db.query(models.Option.id, func.count(models.Vote.id))
+            .outerjoin(models.Vote, models.Vote.option_id == models.Option.id)
+            .filter(models.Option.poll_id == poll_id)
+            .group_by(models.Option.id)
+            .all()
+        )
+        tallies = {str(option_id): count for option_id, count in counts}
+        results = {"total_ballots": sum(tallies.values()), "tallies": tallies, "rounds": None, "winner": None}
+    else:
+        # cached per poll and kept current with this instance's ballots
+        results = await tally.get_results(poll.id, poll.voting_method)
+
+    return {
+        "poll_id": poll.id,
+        "voting_method": poll.voting_method,
+        "closed": poll.closed_at is not None,
+        **results,
+    }
+
+
+# Get polls (with votes)
+@routers.get("/{poll_id}", response_model=schema.Poll)
+async def get_polls(poll_id: UUID, request: Request):
+    def build():
+        db = sessionlocal()
+        try:
+            return _poll_adapter.dump_json(_poll_adapter.validate_python(_poll_data(db, poll_id)), by_alias=True)
+        finally:
+            db.close()
+
+    # keyed by the canonical id string, which is what writes invalidate
+    key = str(poll_id)
+    body = await snapshot_cache.get_or_build(f"polls:{key}", build, poll_id=key)
+    return body.to_response(request.headers.get("accept-encoding"))
@@ -1,48 +1,163 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from app import db
 from app.db import get_db
 from app import models, schema
 from app.utils.dependencies import get_current_user  
 from app.routes.ws import broadcast_vote_update
+from app.utils import idempotency
+from app.utils import snapshot_cache
+from app.utils import closing
+from app.utils import tally
+from typing import Optional
 
 routers = APIRouter()
 
+
+def _lock_open_poll(db: Session, poll_id):
+    """The poll row, key-share locked; 404 if missing, 400 if closed."""
+    # closed polls seen before are rejected without touching the database
+    if closing.is_known_closed(poll_id):
+        raise HTTPException(status_code=400, detail="This poll is closed.")
+
+    # the key-share lock waits for a close in progress, so no vote lands
+    # after the results are frozen
+    poll = (
+        db.query(models.Poll.id, models.Poll.closes_at, models.Poll.closed_at, models.Poll.voting_method, models.Poll.max_choices)
+        .filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None))
+        .with_for_update(key_share=True)
+        .first()
+    )
+    if not poll:
+        raise HTTPException(status_code=404, detail="Poll not found")
+    if closing.is_closed(poll.closes_at, poll.closed_at):
+        closing.remember_closed(poll_id)
+        raise HTTPException(status_code=400, detail="This poll is closed.")
+    return poll
+
+
 # Cast Vote
 @routers.post("/", response_model=schema.VoteCreate)
-async def cast_vote(vote: schema.VoteCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    #check if user voted already
-    existing_vote = (
-        db.query(models.Vote)
-        .join(models.Option)
-        .filter(
-            models.Option.poll_id == vote.poll_id,
-            models.Vote.user_id == current_user.id
+async def cast_vote(vote: schema.VoteCreate,
+                    response: Response,
+                    db: Session = Depends(get_db),
+                    current_user: models.User = Depends(get_current_user),
+                    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    request_hash = idempotency.fingerprint(vote.model_dump())
+    replay = await idempotency.begin("cast_vote", current_user.id, idempotency_key, request_hash)
+    if replay is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return replay
+
+    try:
+        poll = _lock_open_poll(db, vote.poll_id)
+        if poll.voting_method != "single":
+            raise HTTPException(status_code=400, detail="This poll takes ballots, use /api/votes/ballot.")
+
+        #check if user voted already
+        existing_vote = (
+            db.query(models.Vote)
+            .join(models.Option)
+            .filter(
+                models.Option.poll_id == vote.poll_id,
+                models.Vote.user_id == current_user.id
+            )
+            .first()
         )
-        .first()
-    )
 
-    if existing_vote:
-        raise HTTPException(
-            status_code=400,
-            detail="You have already voted in this poll."
+        if existing_vote:
+            raise HTTPException(
+                status_code=400,
+                detail="You have already voted in this poll."
+            )
+        
+        # Create a new vote
+        db_vote = models.Vote(
+            poll_id = vote.poll_id,
+            option_id = vote.option_id,
+            user_id = current_user.id
         )
-    
-    # Create a new vote
-    db_vote = models.Vote(
-        poll_id = vote.poll_id,
-        option_id = vote.option_id,
-        user_id = current_user.id
-    )
 
-    db.add(db_vote)
-    db.commit()
-    db.refresh(db_vote)
+        db.add(db_vote)
+        db.commit()
+    except Exception:
+        db.rollback()
+        await idempotency.release("cast_vote", current_user.id, idempotency_key)
+        raise
+
+    await idempotency.complete("cast_vote", current_user.id, idempotency_key, request_hash, vote.model_dump(mode="json"))
+    await snapshot_cache.invalidate(vote.poll_id)
 
     await broadcast_vote_update(str(vote.poll_id))
 
     return vote
 
+# Cast a ballot in a multi-select or ranked-choice poll
+@routers.post("/ballot", response_model=schema.BallotCreate)
+async def cast_ballot(ballot: schema.BallotCreate,
+                      response: Response,
+                      db: Session = Depends(get_db),
+                      current_user: models.User = Depends(get_current_user),
+                      idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    request_hash = idempotency.fingerprint(ballot.model_dump())
+    replay = await idempotency.begin("cast_ballot", current_user.id, idempotency_key, request_hash)
+    if replay is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        return replay
+
+    try:
+        poll = _lock_open_poll(db, ballot.poll_id)
+        if poll.voting_method == "single":
+            raise HTTPException(status_code=400, detail="This poll takes a single vote, use /api/votes/.")
+
+        # ballots store option positions, in the order given
+        positions = dict(
+            db.query(models.Option.id, models.Option.position)
+            .filter(models.Option.poll_id == ballot.poll_id)
+            .all()
+        )
+        if len(set(ballot.option_ids)) != len(ballot.option_ids):
+            raise HTTPException(status_code=400, detail="Each option can be chosen only once.")
+        if any(option_id not in positions for option_id in ballot.option_ids):
+            raise HTTPException(status_code=400, detail="Option does not belong to this poll.")
+        max_choices = poll.max_choices or len(positions)
+        if len(ballot.option_ids) > max_choices:
+            raise HTTPException(status_code=400, detail=f"At most {max_choices} options can be chosen.")
+        choices = [positions[option_id] for option_id in ballot.option_ids]
+
+        existing_ballot = (
+            db.query(models.Ballot.id)
+            .filter(models.Ballot.poll_id == ballot.poll_id, models.Ballot.user_id == current_user.id)
+            .first()
+        )
+        if existing_ballot:
+            raise HTTPException(status_code=400, detail="You have already voted in this poll.")
+
+        db.add(models.Ballot(poll_id=ballot.poll_id, user_id=current_user.id, choices=choices))
+        db.flush()
+        # tells cached tallies whether they already read this ballot
+        xid = int(db.execute(text("SELECT pg_current_xact_id()::text")).scalar_one())
+        db.commit()
+    except IntegrityError:
+        # a concurrent ballot from the same user won the race
+        db.rollback()
+        await idempotency.release("cast_ballot", current_user.id, idempotency_key)
+        raise HTTPException(status_code=400, detail="You have already voted in this poll.")
+    except Exception:
+        db.rollback()
+        await idempotency.release("cast_ballot", current_user.id, idempotency_key)
+        raise
+
+    await idempotency.complete("cast_ballot", current_user.id, idempotency_key, request_hash, ballot.model_dump(mode="json"))
+    await tally.record_ballot(ballot.poll_id, choices, xid)
+    await snapshot_cache.invalidate(ballot.poll_id)
+
+    await broadcast_vote_update(str(ballot.poll_id))
+
+    return ballot
+
 @routers.get("/users/{poll_id}")
 def get_user_vote(
     poll_id: str,
@@ -51,10 +166,27 @@ def get_user_vote(
 ):
     existing_vote = (
         db.query(models.Vote)
-        .filter(models.Vote.poll_id == poll_id, models.Vote.user_id == current_user.id)
+        .join(models.Poll)
+        .filter(
+            models.Vote.poll_id == poll_id,
+            models.Vote.user_id == current_user.id,
+            models.Poll.deleted_at.is_(None)
+        )
         .first()
     )
     if not existing_vote:
+        existing_ballot = (
+            db.query(models.Ballot)
+            .join(models.Poll)
+            .filter(
+                models.Ballot.poll_id == poll_id,
+                models.Ballot.user_id == current_user.id,
+                models.Poll.deleted_at.is_(None)
+            )
+            .first()
+        )
+        if existing_ballot:
+            return {"voted": True, "option_ids": _ballot_option_ids(db, existing_ballot)}
         return {"voted": False}
 
     return {
@@ -68,5 +200,29 @@ def get_all_user_votes(
     current_user: models.User = Depends(get_current_user)
 ):
     """Get all user's votes across all polls in one request."""
-    votes = db.query(models.Vote).filter(models.Vote.user_id == current_user.id).all()
-    return {vote.poll_id: {"option_id": str(vote.option_id), "voted": True} for vote in votes}
\ No newline at end of file
+    votes = (
+        db.query(models.Vote)
+        .join(models.Poll)
+        .filter(models.Vote.user_id == current_user.id, models.Poll.deleted_at.is_(None))
+        .all()
+    )
+    ballots = (
+        db.query(models.Ballot)
+        .join(models.Poll)
+        .filter(models.Ballot.user_id == current_user.id, models.Poll.deleted_at.is_(None))
+        .all()
+    )
+    result = {vote.poll_id: {"option_id": str(vote.option_id), "voted": True} for vote in votes}
+    for ballot in ballots:
+        result[ballot.poll_id] = {"option_ids": _ballot_option_ids(db, ballot), "voted": True}
+    return result
+
+
+def _ballot_option_ids(db: Session, ballot: models.Ballot) -> list:
+    # positions back to option ids, keeping the ballot's order
+    options = dict(
+        db.query(models.Option.position, models.Option.id)
+        .filter(models.Option.poll_id == ballot.poll_id)
+        .all()
+    )
+    return [str(options[position]) for position in ballot.choices if position in options]
@@ -1,72 +1,200 @@
-import os
 import asyncio
 import json
-import redis.asyncio as redis
+from typing import Optional
+from uuid import UUID
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from sqlalchemy import func
 from app.db import  get_db , sessionlocal
 from app import models
 from app.models import Poll, Option
-import redis.asyncio as redis
-from redis.asyncio import Redis
-from typing import Optional
+from app.redis_pool import get_redis, publish, breaker
+from app.utils import msgpack_protocol
+from app.utils.event_hub import Event, EventHub
+from app.utils import snapshot_cache
+from app.utils import closing
+from app.utils import poll_state
+from app.utils import tally
 
 
 routers = APIRouter(prefix="/ws", tags=["websocket"])
 
-redis_url = os.getenv("REDIS_URL")
-redis_client: Optional[Redis] = None
-active_connections = {}
+# shared fan-out of Redis channels to WebSocket and SSE subscribers
+event_hub = EventHub()
+# resubscribe open channels once the Redis circuit closes again
+breaker.on_recover.append(event_hub.reconnect)
+
+
+async def send_event(websocket: WebSocket, event: Event):
+    # frames are cached on the event, so each format is encoded once per event
+    if websocket.state.protocol == msgpack_protocol.SUBPROTOCOL:
+        await websocket.send_bytes(event.msgpack)
+    else:
+        await websocket.send_text(event.data)
+
+
+async def send_local(poll_id: Optional[str], message: dict, data: Optional[str] = None):
+    """Fallback when Redis is unavailable: deliver to this instance's subscribers only.
+
+    Goes through the event hub like a Redis message, so WebSocket and SSE
+    subscribers of the poll and of the global channel all receive it.
+    """
+    data = data if data is not None else json.dumps(message)
+    if poll_id is not None:
+        event_hub.dispatch(f"poll:{poll_id}", data)
+    event_hub.dispatch("polls:global", data)
+
+
+async def accept(websocket: WebSocket):
+    protocol = msgpack_protocol.negotiate(websocket)
+    websocket.state.protocol = protocol
+    await websocket.accept(subprotocol=protocol)
 
-# Redis Setup
-async def get_redis():
-    global redis_client
-    if redis_client is None:
-        try:
-            redis_client = redis.from_url(redis_url , encoding="utf-8", decode_responses=True)
-            await redis_client.ping() 
-            print("Connected to Redis")
-        except Exception as e:
-            print(f"Failed to connect to Redis: {e}") 
-            redis_client = None  
-    return redis_client
+
+async def forward_events(websocket: WebSocket, channel: str, snapshot=None):
+    # relay hub events for a channel until the client goes away
+    queue = await event_hub.subscribe(channel)
+    try:
+        if snapshot is not None:
+            # fetched after subscribing so no update in between is lost
+            try:
+                events = await snapshot()
+            except poll_state.StateUnavailable:
+                await websocket.close(code=1013)
+                return
+            if events is None:
+                await websocket.close(code=1008)
+                return
+            for event in events:
+                await send_event(websocket, event)
+
+        while True:
+            event = await queue.get()
+            if event is None:
+                # too slow to keep up, ask the client to reconnect
+                await websocket.close(code=1013)
+                return
+            await send_event(websocket, event)
+    finally:
+        event_hub.unsubscribe(channel, queue)
+
+
+def vote_update_message(db, poll_id: str) -> dict:
+    result = (
+        db.query(models.PollResult.tallies)
+        .join(models.Poll, models.Poll.id == models.PollResult.poll_id)
+        .filter(models.PollResult.poll_id == poll_id, models.Poll.deleted_at.is_(None))
+        .first()
+    )
+    if result is not None:
+        # closed poll: frozen tallies, votes is not read
+        options = db.query(models.Option.id, models.Option.text).filter(models.Option.poll_id == poll_id).all()
+        payload = [{"option_id": str(opt_id), "text": text, "votes": result.tallies.get(str(opt_id), 0)} for opt_id, text in options]
+        return {"type": "vote_update", "poll_id": str(poll_id), "options": payload}
+
+    method = db.query(models.Poll.voting_method).filter(models.Poll.id == poll_id).scalar()
+    if method in ("multi", "ranked"):
+        # ballot polls: approvals or first choices by option position
+        counts = tally.preference_counts(db, poll_id, method)
+        options = (
+            db.query(models.Option.id, models.Option.text, models.Option.position)
+            .join(models.Poll, models.Poll.id == models.Option.poll_id)
+            .filter(models.Option.poll_id == poll_id, models.Poll.deleted_at.is_(None))
+            .order_by(models.Option.position)
+            .all()
+        )
+        payload = [{"option_id": str(opt_id), "text": text, "votes": counts.get(position, 0)} for opt_id, text, position in options]
+        return {"type": "vote_update", "poll_id": str(poll_id), "options": payload}
+
+    # one grouped query instead of a COUNT per option
+    options = (
+        db.query(models.Option.id , models.Option.text, func.count(models.Vote.id))
+        .join(models.Poll, models.Poll.id == models.Option.poll_id)
+        .outerjoin(models.Vote, models.Vote.option_id == models.Option.id)
+        .filter(models.Option.poll_id == poll_id, models.Poll.deleted_at.is_(None))
+        .group_by(models.Option.id, models.Option.text)
+        .all()
+    )
+    payload = [{"option_id": str(opt_id), "text": text, "votes": count} for opt_id, text, count in options]
+    return {"type": "vote_update", "poll_id": str(poll_id), "options": payload}
+
+
+def _load_poll_snapshot(poll_id: str):
+    db = sessionlocal()
+    try:
+        poll = db.query(models.Poll).filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None)).first()
+        if not poll:
+            return None
+        messages = [
+            vote_update_message(db, poll_id),
+            {"type": "like_update", "poll_id": str(poll_id), "likes": poll.likes_count or 0},
+        ]
+        if poll.result is not None:
+            messages.append(closing.closed_message(closing.results_data(poll.result)))
+    finally:
+        db.close()
+    return _snapshot_events(poll_id, messages)
+
+
+def _snapshot_events(poll_id: str, messages: list) -> list:
+    return [Event(0, f"poll:{poll_id}", message, json.dumps(message)) for message in messages]
+
+
+async def poll_snapshot(poll_id: str, from_database: bool = True):
+    """Current vote and like state of a poll, for newly joined subscribers only.
+
+    Cached until the next write to the poll; concurrent joins share one query.
+    Returns None if the poll does not exist. Without a database the state
+    stored in Redis is used, raising StateUnavailable if Redis is down.
+    """
+    if not from_database:
+        messages = await poll_state.load(poll_id)
+        return None if messages is None else _snapshot_events(poll_id, messages)
+    return await snapshot_cache.get_or_compute(
+        f"ws:{poll_id}", lambda: _load_poll_snapshot(poll_id), poll_id=poll_id
+    )
 
 
 # Broadcast vote updates
 async def broadcast_vote_update(poll_id: str):
     # Send updated vote counts to all WebSocket clients
+    # read before the counts, so the stored state is at least this new
+    version = await snapshot_cache.poll_version(poll_id)
     db = sessionlocal()
     try:
-        options = db.query(models.Option.id , models.Option.text).filter(models.Option.poll_id == poll_id).all()
-        payload = []
-        for opt in options:
-            count = db.query(models.Vote).filter(models.Vote.option_id == opt.id).count()
-            payload.append({"option_id": str(opt.id), "text": opt.text, "votes": count})
-
-        message = {"type": "vote_update", "poll_id": str(poll_id), "options": payload}
-
-        redis_conn = await get_redis()
-        if redis_conn:
-            # Broadcast to both poll-specific and global channels
-            await redis_conn.publish(f"poll:{poll_id}", json.dumps(message))
-            await redis_conn.publish("polls:global", json.dumps(message))
-            print(f"Published vote update for poll {poll_id} to Redis")
+        message = vote_update_message(db, poll_id)
+        await poll_state.save(poll_id, version, message)
 
+        # Broadcast to both poll-specific and global channels
+        data = json.dumps(message)
+        if await publish(f"poll:{poll_id}", data):
+            await publish("polls:global", data)
+            print(f"Published vote update for poll {poll_id} to Redis")
         else:
-            if poll_id in active_connections:
-                for connection in active_connections[poll_id]:
-                    try:
-                        await connection.send_json(message)
-                    except Exception as e:
-                        print(f"Error sending message to client: {e}")
+            await send_local(poll_id, message)
 
     finally:
         db.close()
 
+# Broadcast the final results of a closed poll
+async def broadcast_poll_closed(results: dict):
+    poll_id = results["poll_id"]
+    await snapshot_cache.invalidate(poll_id)
+    version = await snapshot_cache.poll_version(poll_id)
+
+    message = closing.closed_message(results)
+    await poll_state.save(poll_id, version, message)
+    data = json.dumps(message)
+    if await publish(f"poll:{poll_id}", data):
+        await publish("polls:global", data)
+    else:
+        await send_local(poll_id, message)
+
 # Broadcast like updates
 async def broadcast_like_update(poll_id: str):
+    version = await snapshot_cache.poll_version(poll_id)
     db = sessionlocal()
     try:
-        poll = db.query(models.Poll).filter(models.Poll.id == poll_id).first()
+        poll = db.query(models.Poll).filter(models.Poll.id == poll_id, models.Poll.deleted_at.is_(None)).first()
         if not poll:
             return
         
@@ -75,21 +203,15 @@ async def broadcast_like_update(poll_id: str):
             "poll_id": str(poll_id),
             "likes": poll.likes_count or 0,
         }
+        await poll_state.save(poll_id, version, message)
 
-        redis_conn = await get_redis()
-        if redis_conn:
-            # Broadcast to both poll-specific and global channels
-            await redis_conn.publish(f"poll:{poll_id}", json.dumps(message))
-            await redis_conn.publish("polls:global", json.dumps(message))
+        # Broadcast to both poll-specific and global channels
+        data = json.dumps(message)
+        if await publish(f"poll:{poll_id}", data):
+            await publish("polls:global", data)
             print(f"Published like update for poll {poll_id} to Redis")
-
         else:
-            if poll_id in active_connections:
-                for con in active_connections[poll_id]:
-                    try:
-                        await con.send_json(message)
-                    except Exception as e:
-                        print(f"Error sending message to client: {e}")
+            await send_local(poll_id, message)
     finally:
         db.close()
 
@@ -97,64 +219,30 @@ async def broadcast_like_update(poll_id: str):
 # Global WebSocket endpoint (new poll broadcast)
 @routers.websocket("/ws/poll")
 async def websocket_all_polls(websocket : WebSocket):
-    await websocket.accept()
-
-    redis_conn = await get_redis()
-    pubsub = None
-    if redis_conn:
-        pubsub = redis_conn.pubsub()
-        await pubsub.subscribe("polls:global")
+    await accept(websocket)
 
     try:
-        if pubsub:
-            async for message in pubsub.listen():
-                if message and message['type'] == 'message':
-                    data = json.loads(message['data'])
-                    await websocket.send_json(data)
-                else:
-                    while True:
-                        await asyncio.sleep(15)
-
+        await forward_events(websocket, "polls:global")
     except WebSocketDisconnect:
-        if pubsub:
-            await pubsub.unsubscribe("polls:global")
-            await pubsub.close()
         print("WebSocket disconnected from global polls")
 
 
 # Per-poll WebSocket endpoint
 @routers.websocket("/ws/poll/{poll_id}")
 async def websocket_poll_update(websocket: WebSocket, poll_id: str):
-    await websocket.accept()
-
-    await broadcast_vote_update(poll_id)
-    await broadcast_like_update(poll_id)
-
-    if poll_id not in active_connections:
-        active_connections[poll_id] = []
-    active_connections[poll_id].append(websocket)
-
-    redis_conn = await get_redis()
-    pubsub = None
-    if redis_conn:
-        pubsub = redis_conn.pubsub()
-        await pubsub.subscribe(f"poll:{poll_id}")
+    await accept(websocket)
 
     try:
-        if pubsub:
-            async for message in pubsub.listen():
-                if message and message['type'] == 'message':
-                    data = json.loads(message['data'])
-                    await websocket.send_json(json.loads(message["data"]))
-                else:
-                    while True:
-                        await asyncio.sleep(15)
+        # canonical form, matches the keys used for cache invalidation
+        poll_id = str(UUID(poll_id))
+    except ValueError:
+        await websocket.close(code=1008)
+        return
 
+    try:
+        # only the joining client gets the current state, nothing is published
+        # the WebSocket gateway has no database and sets this to False on its app
+        from_database = getattr(websocket.app.state, "snapshots_from_database", True)
+        await forward_events(websocket, f"poll:{poll_id}", snapshot=lambda: poll_snapshot(poll_id, from_database))
     except WebSocketDisconnect:
-        active_connections[poll_id].remove(websocket)
-        if not active_connections[poll_id]:
-            del active_connections[poll_id]
-        if pubsub:
-            await pubsub.unsubscribe(f"poll:{poll_id}")
-            await pubsub.close()
-        print(f"WebSocket disconnected from poll {poll_id}")
\ No newline at end of file
+        print(f"WebSocket disconnected from poll {poll_id}")
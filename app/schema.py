@@ -1,5 +1,5 @@
 from pydantic import BaseModel , Field , EmailStr 
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from uuid import UUID
 from datetime import datetime
 
@@ -58,12 +58,20 @@ class PollBase(BaseModel):
 
 class PollCreate(PollBase):
     options: List[OptionCreate]
+    closes_at: Optional[datetime] = None
+    voting_method: Literal["single", "multi", "ranked"] = "single"
+    # most options a ballot may pick or rank; defaults to all of them
+    max_choices: Optional[int] = Field(None, ge=1)
 
 class Poll(PollBase):
     id: UUID
     created_at: datetime
     likes: int = Field(..., alias="likes_count")
     created_by: str
+    closes_at: Optional[datetime] = None
+    closed_at: Optional[datetime] = None
+    voting_method: str = "single"
+    max_choices: Optional[int] = None
     options: List[Option] = []
 
     model_config = {
@@ -71,11 +79,51 @@ class Poll(PollBase):
     "populate_by_name": True
     }
 
+class PollResults(BaseModel):
+    poll_id: UUID
+    closed_at: datetime
+    total_votes: int
+    tallies: Dict[UUID, int]
+    rounds: Optional[List[dict]] = None
+    model_config = {
+    "from_attributes": True
+    }
+
+class TallyRound(BaseModel):
+    counts: Dict[UUID, int]
+    # ballots with no remaining choice in the race
+    exhausted: int
+    eliminated: Optional[UUID] = None
+
+class PollTally(BaseModel):
+    poll_id: UUID
+    voting_method: str
+    closed: bool
+    total_ballots: int
+    tallies: Dict[UUID, int]
+    rounds: Optional[List[TallyRound]] = None
+    winner: Optional[UUID] = None
+
+class PollSearchResult(PollBase):
+    id: UUID
+    created_at: datetime
+    created_by: str
+    rank: float
+
+class PollSearchPage(BaseModel):
+    results: List[PollSearchResult]
+    next_cursor: Optional[str] = None
+
 #Vote Schemas
 class VoteCreate(BaseModel):
     poll_id: UUID
     option_id: UUID
 
+class BallotCreate(BaseModel):
+    poll_id: UUID
+    # in order of preference for ranked-choice polls
+    option_ids: List[UUID] = Field(..., min_length=1)
+
 #Like Schemas
 class LikeUpdate(BaseModel):
     poll_id: UUID
\ No newline at end of file
@@ -0,0 +1,135 @@
+# app/utils/analytics.py
+# Vectorized aggregations over the Arrow tables written by app/utils/export.py.
+# Every function works on whole columns with NumPy, with no per-row Python loops.
+import uuid
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # analytics is optional, the API runs without pyarrow
+    pa = None
+    pq = None
+
+
+MICROSECONDS_PER_HOUR = 3_600_000_000
+# users per block when building the user x poll incidence matrix
+OVERLAP_BLOCK_SIZE = 100_000
+
+
+def load_table(path: str):
+    """Read an exported Parquet or Arrow IPC stream file."""
+    if path.endswith(".parquet"):
+        return pq.read_table(path)
+    with pa.ipc.open_stream(path) as reader:
+        return reader.read_all()
+
+
+def _uuid_values(column) -> np.ndarray:
+    # fixed_size_binary(16) column as a zero-copy array of 16-byte values
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    data = column.buffers()[1]
+    return np.frombuffer(data, dtype="V16", count=column.offset + len(column))[column.offset:]
+
+
+def _encode(values: np.ndarray):
+    # dictionary-encode: sorted unique values and an integer code per row
+    uniques, codes = np.unique(values, return_inverse=True)
+    return uniques, codes.reshape(-1)
+
+
+def _to_binary(values: np.ndarray):
+    return pa.FixedSizeBinaryArray.from_buffers(pa.binary(16), len(values), [None, pa.py_buffer(values.tobytes())])
+
+
+def option_tallies(votes):
+    """Votes per option: table of poll_id, option_id, votes."""
+    poll_values = _uuid_values(votes["poll_id"])
+    options, option_codes = _encode(_uuid_values(votes["option_id"]))
+
+    counts = np.bincount(option_codes, minlength=len(options))
+    # every vote row of an option carries the same poll, so any row will do
+    row_of_option = np.empty(len(options), dtype=np.int64)
+    row_of_option[option_codes] = np.arange(len(option_codes))
+
+    return pa.table({
+        "poll_id": _to_binary(poll_values[row_of_option]),
+        "option_id": _to_binary(options),
+        "votes": counts,
+    })
+
+
+def hourly_histogram(votes):
+    """Votes per poll per hour: table of poll_id, hour, votes."""
+    polls, poll_codes = _encode(_uuid_values(votes["poll_id"]))
+    micros = votes["created_at"].cast(pa.int64()).to_numpy()
+    if len(micros) == 0:
+        return pa.table({
+            "poll_id": _to_binary(polls),
+            "hour": pa.array([], pa.timestamp("us", tz="UTC")),
+            "votes": pa.array([], pa.int64()),
+        })
+
+    hours = micros // MICROSECONDS_PER_HOUR
+    first_hour = hours.min()
+    span = int(hours.max() - first_hour) + 1
+
+    # one integer key per (poll, hour) bucket, then count the keys
+    keys = poll_codes.astype(np.int64) * span + (hours - first_hour)
+    buckets, counts = np.unique(keys, return_counts=True)
+
+    return pa.table({
+        "poll_id": _to_binary(polls[buckets // span]),
+        "hour": pa.array((buckets % span + first_hour) * MICROSECONDS_PER_HOUR, pa.timestamp("us", tz="UTC")),
+        "votes": counts,
+    })
+
+
+def poll_overlap(votes, poll_ids=None, top: int = 50):
+    """Number of users who voted in both polls, for every pair of polls.
+
+    Uses the given poll_ids, or the `top` polls by vote count. Returns the
+    poll ids, a k x k matrix of shared voters (the diagonal holds each poll's
+    voter count) and the matching Jaccard similarity matrix.
+    """
+    polls, poll_codes = _encode(_uuid_values(votes["poll_id"]))
+    users, user_codes = _encode(_uuid_values(votes["user_id"]))
+
+    if poll_ids is not None:
+        wanted = np.frombuffer(b"".join(uuid.UUID(str(p)).bytes for p in poll_ids), dtype="V16")
+        selected = np.flatnonzero(np.isin(polls, wanted))
+    else:
+        selected = np.argsort(-np.bincount(poll_codes, minlength=len(polls)), kind="stable")[:top]
+    k = len(selected)
+    if k == 0:
+        return [], np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0))
+
+    # column of each vote row in the result, -1 for polls that were not selected
+    column_of_poll = np.full(len(polls), -1, dtype=np.int64)
+    column_of_poll[selected] = np.arange(k)
+    columns = column_of_poll[poll_codes]
+    keep = columns >= 0
+
+    # distinct (user, poll) pairs, sorted by user
+    pairs = np.unique(user_codes[keep].astype(np.int64) * k + columns[keep])
+    pair_users = pairs // k
+    pair_columns = pairs % k
+
+    # multiply the sparse user x poll incidence matrix by its transpose, one
+    # block of users at a time to bound memory
+    overlap = np.zeros((k, k), dtype=np.int64)
+    bounds = np.searchsorted(pair_users, np.arange(0, len(users) + OVERLAP_BLOCK_SIZE, OVERLAP_BLOCK_SIZE))
+    for block, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if start == end:
+            continue
+        incidence = np.zeros((OVERLAP_BLOCK_SIZE, k), dtype=np.float32)
+        incidence[pair_users[start:end] - block * OVERLAP_BLOCK_SIZE, pair_columns[start:end]] = 1.0
+        overlap += (incidence.T @ incidence).astype(np.int64)
+
+    voters = np.diag(overlap)
+    union = voters[:, None] + voters[None, :] - overlap
+    jaccard = np.divide(overlap, union, out=np.zeros((k, k)), where=union > 0)
+
+    ids = [uuid.UUID(bytes=value.tobytes()) for value in polls[selected]]
+    return ids, overlap, jaccard
@@ -7,6 +7,7 @@ from datetime import timezone
 from typing import Optional
 from fastapi import HTTPException, status
 from jose import JWTError
+from app.utils.profiling import span
 
 
 # Secret key for JWT
@@ -19,11 +20,13 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 # Password hashing
 # ---------------------------
 def hash_password(password: str) -> str:
-    return pbkdf2_sha256.hash(password)
+    with span("hash_password"):
+        return pbkdf2_sha256.hash(password)
 
 
 def verify_password(password: str, hashed: str) -> bool:
-    return pbkdf2_sha256.verify(password, hashed)
+    with span("verify_password"):
+        return pbkdf2_sha256.verify(password, hashed)
 
 
 # ---------------------------
@@ -0,0 +1,154 @@
+# app/utils/closing.py
+import os
+import json
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timezone
+from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
+from app.db import sessionlocal, init_db
+from app import models
+from app.utils import tally
+
+
+# how often polls past their closes_at are frozen
+CLOSE_SWEEP_SECONDS = int(os.getenv("CLOSE_SWEEP_SECONDS", "30"))
+# closed poll ids remembered per process; closing is permanent so entries never go stale
+CLOSED_CACHE_SIZE = 100000
+
+_closed: "OrderedDict[str, bool]" = OrderedDict()
+
+
+def remember_closed(poll_id):
+    key = str(poll_id)
+    _closed[key] = True
+    _closed.move_to_end(key)
+    while len(_closed) > CLOSED_CACHE_SIZE:
+        _closed.popitem(last=False)
+
+
+def is_known_closed(poll_id) -> bool:
+    """True if this process has already seen the poll closed; no database access."""
+    return str(poll_id) in _closed
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_utc(value: datetime) -> datetime:
+    # naive datetimes from clients are taken as UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def is_closed(closes_at, closed_at) -> bool:
+    return closed_at is not None or (closes_at is not None and as_utc(closes_at) <= utcnow())
+
+
+def results_data(result: models.PollResult) -> dict:
+    return {
+        "poll_id": str(result.poll_id),
+        "closed_at": result.closed_at,
+        "total_votes": result.total_votes,
+        "tallies": result.tallies,
+        "rounds": result.rounds,
+    }
+
+
+def freeze_results(db, poll_id):
+    """Close a poll and store its final tallies; returns (results, whether this call froze them).
+
+    The poll row is locked for update, which waits for in-flight votes (they
+    hold a key-share lock on it) and makes later ones see the poll closed.
+    Whoever loses the race gets the existing results and False, so only the
+    caller that closed the poll announces it. (None, False) if the poll is gone.
+    """
+    poll = db.query(models.Poll).filter(models.Poll.id == poll_id).with_for_update().first()
+    if poll is None:
+        db.rollback()
+        return None, False
+
+    result = db.query(models.PollResult).filter(models.PollResult.poll_id == poll_id).first()
+    frozen = result is None
+    if frozen:
+        rounds = None
+        if poll.voting_method == "single":
+            counts = (
+                db.query(models.Option.id, func.count(models.Vote.id))
+                .outerjoin(models.Vote, models.Vote.option_id == models.Option.id)
+                .filter(models.Option.poll_id == poll_id)
+                .group_by(models.Option.id)
+                .all()
+            )
+            tallies = {str(option_id): count for option_id, count in counts}
+            total_votes = sum(tallies.values())
+        else:
+            _, option_ids, ballots = tally.load_ballots(db, poll_id)
+            computed = tally.compute(poll.voting_method, ballots, option_ids)
+            tallies, rounds, total_votes = computed["tallies"], computed["rounds"], computed["total_ballots"]
+        closed_at = utcnow()
+        poll.closed_at = closed_at
+        result = models.PollResult(
+            poll_id=poll.id,
+            closed_at=closed_at,
+            total_votes=total_votes,
+            tallies=tallies,
+            rounds=rounds,
+        )
+        db.add(result)
+    data = results_data(result)
+    db.commit()
+    remember_closed(poll_id)
+    return data, frozen
+
+
+def closed_message(results: dict) -> dict:
+    return {"type": "poll_closed", **results, "closed_at": results["closed_at"].isoformat()}
+
+
+def close_due_polls() -> list:
+    """Freeze every poll whose closes_at has passed; returns the results this call froze."""
+    db = sessionlocal()
+    try:
+        poll_ids = [
+            row.id for row in
+            db.query(models.Poll.id).filter(
+                models.Poll.closed_at.is_(None),
+                models.Poll.deleted_at.is_(None),
+                models.Poll.closes_at <= utcnow(),
+            ).all()
+        ]
+        results = []
+        for poll_id in poll_ids:
+            try:
+                # another worker's sweep or the owner may have closed it first
+                result, frozen = freeze_results(db, poll_id)
+                if frozen:
+                    results.append(result)
+            except Exception as e:
+                db.rollback()
+                print(f"Failed to close poll {poll_id}: {e}")
+        return results
+    finally:
+        db.close()
+
+
+async def close_due_polls_forever(on_closed=None):
+    # background task started in the app lifespan
+    while True:
+        try:
+            for result in await run_in_threadpool(close_due_polls):
+                print(f"Closed poll {result['poll_id']}: {result['total_votes']} votes")
+                if on_closed is not None:
+                    await on_closed(result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Close sweep failed: {e}")
+        await asyncio.sleep(CLOSE_SWEEP_SECONDS)
+
+
+if __name__ == "__main__":
+    init_db()
+    for result in close_due_polls():
+        print(f"Closed poll {result['poll_id']}: {json.dumps(result['tallies'])}")
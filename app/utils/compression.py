@@ -0,0 +1,84 @@
+# app/utils/compression.py
+import os
+import gzip
+from typing import Optional
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+# bodies smaller than this are sent uncompressed, the headers would eat the savings
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings() -> list:
+    # in order of preference
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best encoding the client accepts, or None for identity."""
+    if not accept_encoding:
+        return None
+
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        # mtime=0 keeps the output stable for identical bodies
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressedBody:
+    """A response body together with its compressed variants.
+
+    Variants are produced on first request for that encoding and then reused,
+    so a cached body is compressed at most once per encoding.
+    """
+
+    __slots__ = ("raw", "media_type", "_variants")
+
+    def __init__(self, raw: bytes, media_type: str = "application/json"):
+        self.raw = raw
+        self.media_type = media_type
+        self._variants: dict = {}
+
+    def encoded(self, encoding: Optional[str]):
+        if encoding is None or len(self.raw) < COMPRESSION_MIN_SIZE:
+            return self.raw, None
+        body = self._variants.get(encoding)
+        if body is None:
+            body = self._variants[encoding] = compress(self.raw, encoding)
+        return body, encoding
+
+    def to_response(self, accept_encoding: Optional[str]) -> Response:
+        body, encoding = self.encoded(choose_encoding(accept_encoding))
+        headers = {"Vary": "Accept-Encoding"}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=self.media_type, headers=headers)
@@ -0,0 +1,269 @@
+# app/utils/event_hub.py
+import asyncio
+import json
+import uuid
+from collections import deque
+from typing import Optional
+from app.utils import msgpack_protocol
+from app.redis_pool import get_redis, record_failure
+
+
+# events kept per channel for Last-Event-ID resume
+REPLAY_BUFFER_SIZE = 256
+# seconds a channel keeps listening and buffering after its last subscriber
+# leaves, so a reconnecting client can still resume
+REPLAY_GRACE_SECONDS = 60
+# events queued per subscriber before it is considered too slow and dropped
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+class Event:
+    """One message from a Redis channel, encoded once and shared by every subscriber."""
+
+    __slots__ = ("id", "epoch", "channel", "message", "data", "_sse", "_msgpack")
+
+    def __init__(self, id: int, channel: str, message: dict, data: str, epoch: str = ""):
+        self.id = id
+        # hub that numbered the event; ids from another process or boot mean nothing here
+        self.epoch = epoch
+        self.channel = channel
+        self.message = message
+        self.data = data
+        self._sse = None
+        self._msgpack = None
+
+    @property
+    def type(self) -> str:
+        return self.message.get("type", "message")
+
+    @property
+    def sse(self) -> bytes:
+        if self._sse is None:
+            event_id = f"{self.epoch}-{self.id}" if self.epoch else str(self.id)
+            self._sse = f"id: {event_id}\nevent: {self.type}\ndata: {self.data}\n\n".encode()
+        return self._sse
+
+    @property
+    def msgpack(self) -> bytes:
+        if self._msgpack is None:
+            self._msgpack = msgpack_protocol.encode(self.message)
+        return self._msgpack
+
+
+class ReplayBuffer:
+    """Recent events of one channel.
+
+    A client that saw event `complete_after` or a later one finds everything
+    after it in the buffer. Events before that may have been evicted, or
+    missed while nothing listened to the channel or Redis was unreachable.
+    """
+
+    __slots__ = ("events", "complete_after")
+
+    def __init__(self, size: int, complete_after: int):
+        self.events = deque(maxlen=size)
+        self.complete_after = complete_after
+
+    def append(self, event: Event):
+        if len(self.events) == self.events.maxlen:
+            self.complete_after = max(self.complete_after, self.events[0].id)
+        self.events.append(event)
+
+    def since(self, last_event_id: int) -> Optional[list]:
+        """Events after last_event_id; None if some of them are not in the buffer."""
+        if last_event_id < self.complete_after:
+            return None
+        return [event for event in self.events if event.id > last_event_id]
+
+
+class EventHub:
+    """Fans Redis pub/sub channels out to in-process subscriber queues.
+
+    All subscribers share a single Redis pub/sub connection and a single
+    reader task, so each extra subscriber only costs a small queue.
+    """
+
+    def __init__(self, replay_size: int = REPLAY_BUFFER_SIZE, queue_size: int = SUBSCRIBER_QUEUE_SIZE,
+                 grace: float = REPLAY_GRACE_SECONDS):
+        self.replay_size = replay_size
+        self.queue_size = queue_size
+        self.grace = grace
+        self._subscribers: dict[str, set] = {}
+        # one per channel listened to, including channels in their grace period
+        self._buffers: dict[str, ReplayBuffer] = {}
+        self._releases: dict[str, asyncio.Task] = {}
+        self._next_id = 0
+        # prefixes event ids, so ids from before a restart or from another
+        # instance are not mistaken for ids of this hub's counter
+        self.epoch = uuid.uuid4().hex[:8]
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._tasks: set = set()
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    async def subscribe(self, channel: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        async with self._lock:
+            release = self._releases.pop(channel, None)
+            if release is not None:
+                release.cancel()
+            subscribers = self._subscribers.setdefault(channel, set())
+            if channel not in self._buffers:
+                self._buffers[channel] = ReplayBuffer(self.replay_size, self._next_id + 1)
+                await self._redis_subscribe([channel])
+            elif self._pubsub is None:
+                # connection was lost, reopen it for every channel
+                await self._redis_subscribe([channel])
+            subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        # synchronous so it is safe to call from a cancelled stream
+        subscribers = self._subscribers.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[channel]
+            if channel not in self._releases:
+                task = asyncio.get_running_loop().create_task(self._release(channel))
+                self._releases[channel] = task
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    def parse_event_id(self, value: Optional[str]) -> Optional[int]:
+        """Counter value of an event id issued by this hub; None for any other id."""
+        epoch, _, counter = (value or "").partition("-")
+        if epoch != self.epoch or not counter.isdigit():
+            return None
+        return int(counter)
+
+    def replay(self, channel: str, last_event_id: int) -> Optional[list]:
+        """Buffered events after last_event_id; None if the buffer can't cover them all."""
+        buffer = self._buffers.get(channel)
+        if buffer is None:
+            return None
+        return buffer.since(last_event_id)
+
+    def dispatch(self, channel: str, data: str):
+        buffer = self._buffers.get(channel)
+        if buffer is None:
+            return
+        try:
+            message = json.loads(data)
+        except ValueError:
+            print(f"Ignoring malformed message on {channel}")
+            return
+
+        self._next_id += 1
+        event = Event(self._next_id, channel, message, data, self.epoch)
+        buffer.append(event)
+
+        subscribers = self._subscribers.get(channel, set())
+        for queue in list(subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # slow consumer: end its stream, the client resumes with Last-Event-ID
+                subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    async def _redis_subscribe(self, channels: list):
+        redis_conn = await get_redis()
+        if not redis_conn:
+            return
+        try:
+            if self._pubsub is None:
+                self._pubsub = redis_conn.pubsub()
+                # resubscribe channels that were open before a reconnect;
+                # what was published while disconnected is gone
+                channels = list(self._buffers)
+                for buffer in self._buffers.values():
+                    buffer.complete_after = self._next_id + 1
+            await self._pubsub.subscribe(*channels)
+        except Exception as e:
+            print(f"Event hub failed to subscribe to {channels}: {e}")
+            record_failure(e)
+            await self._reset()
+            return
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(self._read())
+
+    async def _release(self, channel: str):
+        # stop listening to a channel once its grace period passes unused
+        await asyncio.sleep(self.grace)
+        async with self._lock:
+            if self._releases.get(channel) is not asyncio.current_task():
+                return
+            del self._releases[channel]
+            if channel in self._subscribers:
+                return
+            self._buffers.pop(channel, None)
+            if self._pubsub is None:
+                return
+            try:
+                await self._pubsub.unsubscribe(channel)
+            except Exception as e:
+                print(f"Event hub failed to unsubscribe from {channel}: {e}")
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # reconnect() or the next subscribe() opens a fresh connection
+                print(f"Event hub lost Redis connection: {e}")
+                record_failure(e)
+                await self._reset()
+                return
+            if message and message["type"] == "message":
+                self.dispatch(message["channel"], message["data"])
+
+    async def reconnect(self):
+        async with self._lock:
+            if self._buffers and self._pubsub is None:
+                await self._redis_subscribe(list(self._buffers))
+
+    async def close(self):
+        """Stop reading from Redis and end every open subscriber stream."""
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader = None
+
+        for subscribers in self._subscribers.values():
+            for queue in subscribers:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+        self._subscribers.clear()
+        self._buffers.clear()
+        for task in self._releases.values():
+            task.cancel()
+        self._releases.clear()
+
+        await self._reset()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _reset(self):
+        # messages published until the next subscribe are missed, so no
+        # buffer can cover ids from before now
+        for buffer in self._buffers.values():
+            buffer.complete_after = self._next_id + 1
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
@@ -0,0 +1,137 @@
+# app/utils/export.py
+import argparse
+from sqlalchemy import select
+from app import db as database
+from app import models
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # export is optional, the API runs without pyarrow
+    pa = None
+    pq = None
+
+
+# rows fetched from the server-side cursor per Arrow record batch
+EXPORT_CHUNK_SIZE = 50000
+
+# exported columns per table; UUIDs are stored as 16-byte binaries
+EXPORT_TABLES = {
+    "votes": (models.Vote, [("id", "uuid"), ("poll_id", "uuid"), ("option_id", "uuid"), ("user_id", "uuid"), ("created_at", "timestamp")]),
+    "likes": (models.Like, [("id", "uuid"), ("poll_id", "uuid"), ("user_id", "uuid"), ("created_at", "timestamp")]),
+    "options": (models.Option, [("id", "uuid"), ("poll_id", "uuid"), ("text", "string")]),
+}
+
+FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _arrow_type(kind: str):
+    if kind == "uuid":
+        return pa.binary(16)
+    if kind == "timestamp":
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()
+
+
+def arrow_schema(table: str):
+    _, columns = EXPORT_TABLES[table]
+    return pa.schema([(name, _arrow_type(kind)) for name, kind in columns])
+
+
+def _to_batch(rows, columns, schema):
+    arrays = []
+    for (name, kind), values in zip(columns, zip(*rows)):
+        if kind == "uuid":
+            values = [value.bytes for value in values]
+        arrays.append(pa.array(values, type=schema.field(name).type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def iter_batches(table: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Yield Arrow record batches for a table, read through a server-side cursor.
+
+    Rows belonging to soft-deleted polls are skipped.
+    """
+    model, columns = EXPORT_TABLES[table]
+    schema = arrow_schema(table)
+    query = (
+        select(*[getattr(model, name) for name, _ in columns])
+        .join(models.Poll, models.Poll.id == model.poll_id)
+        .where(models.Poll.deleted_at.is_(None))
+    )
+
+    with database.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+        for rows in result.partitions():
+            yield _to_batch(rows, columns, schema)
+
+
+class _ChunkSink:
+    # file-like object that collects written bytes until they are drained
+    def __init__(self):
+        self.chunks = []
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_arrow_ipc(table: str, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """Yield an Arrow IPC stream chunk by chunk, suitable for a streaming response."""
+    sink = _ChunkSink()
+    with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), arrow_schema(table)) as writer:
+        for batch in iter_batches(table, chunk_size):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def write_export(table: str, path: str, format: str = "parquet", chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    """Write a table to an Arrow IPC or Parquet file and return the row count."""
+    schema = arrow_schema(table)
+    rows = 0
+    if format == "parquet":
+        writer = pq.ParquetWriter(path, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(path, schema)
+    with writer:
+        for batch in iter_batches(table, chunk_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export votes, likes or options to a columnar file.")
+    parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="parquet")
+    parser.add_argument("--output", help="output file (default: <table>.<ext>)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if not available():
+        raise SystemExit("pyarrow is required for exports: pip install pyarrow")
+
+    output = args.output or f"{args.table}.{FORMATS[args.format][1]}"
+    database.init_db()
+    count = write_export(args.table, output, args.format, args.chunk_size)
+    print(f"Exported {count} {args.table} rows to {output}")
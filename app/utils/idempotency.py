@@ -0,0 +1,125 @@
+# app/utils/idempotency.py
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+from fastapi import HTTPException
+from app.redis_pool import get_redis, record_failure
+
+
+# how long a stored response is replayed for
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# in-memory fallback when Redis is not available (single instance only)
+LOCAL_STORE_SIZE = 10000
+
+_PENDING = "pending"
+_local_store: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+
+def fingerprint(payload) -> str:
+    # hash of the request body so a reused key with a different body is rejected
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _store_key(scope: str, user_id, key: str) -> str:
+    return f"idem:{scope}:{user_id}:{key}"
+
+
+def _local_get(store_key: str) -> Optional[str]:
+    entry = _local_store.get(store_key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        del _local_store[store_key]
+        return None
+    return value
+
+
+def _local_set(store_key: str, value: str, nx: bool = False) -> bool:
+    if nx and _local_get(store_key) is not None:
+        return False
+    _local_store[store_key] = (time.monotonic() + IDEMPOTENCY_TTL, value)
+    _local_store.move_to_end(store_key)
+    while len(_local_store) > LOCAL_STORE_SIZE:
+        _local_store.popitem(last=False)
+    return True
+
+
+async def _set(store_key: str, value: str, nx: bool = False) -> bool:
+    redis_conn = await get_redis()
+    if redis_conn:
+        try:
+            return bool(await redis_conn.set(store_key, value, nx=nx, ex=IDEMPOTENCY_TTL))
+        except Exception as e:
+            print(f"Idempotency store error: {e}")
+            record_failure(e)
+    return _local_set(store_key, value, nx=nx)
+
+
+async def _get(store_key: str) -> Optional[str]:
+    redis_conn = await get_redis()
+    if redis_conn:
+        try:
+            return await redis_conn.get(store_key)
+        except Exception as e:
+            print(f"Idempotency store error: {e}")
+            record_failure(e)
+    return _local_get(store_key)
+
+
+async def _delete(store_key: str):
+    redis_conn = await get_redis()
+    if redis_conn:
+        try:
+            await redis_conn.delete(store_key)
+            return
+        except Exception as e:
+            print(f"Idempotency store error: {e}")
+            record_failure(e)
+    _local_store.pop(store_key, None)
+
+
+async def begin(scope: str, user_id, key: Optional[str], request_hash: str):
+    """Reserve an idempotency key.
+
+    Returns the stored response when the request is a retry, or None when the
+    caller should go ahead and process the request.
+    """
+    if not key:
+        return None
+
+    store_key = _store_key(scope, user_id, key)
+    pending = json.dumps({"status": _PENDING, "fingerprint": request_hash})
+    if await _set(store_key, pending, nx=True):
+        return None
+
+    stored = await _get(store_key)
+    if stored is None:
+        # expired between the two calls, treat it as a fresh request
+        await _set(store_key, pending)
+        return None
+
+    entry = json.loads(stored)
+    if entry["fingerprint"] != request_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was reused with a different request")
+    if entry["status"] == _PENDING:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is already in progress")
+    return entry["response"]
+
+
+async def complete(scope: str, user_id, key: Optional[str], request_hash: str, response):
+    """Store the response so retries with the same key replay it."""
+    if not key:
+        return
+    entry = {"status": "done", "fingerprint": request_hash, "response": response}
+    await _set(_store_key(scope, user_id, key), json.dumps(entry, default=str))
+
+
+async def release(scope: str, user_id, key: Optional[str]):
+    """Drop a reservation after a failed request so it can be retried."""
+    if not key:
+        return
+    await _delete(_store_key(scope, user_id, key))
@@ -0,0 +1,42 @@
+# app/utils/msgpack_protocol.py
+from typing import Optional
+from uuid import UUID
+from fastapi import WebSocket
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional, clients fall back to JSON
+    msgpack = None
+
+
+# WebSocket subprotocol clients request to receive binary MessagePack frames.
+# Keys named "id" or ending in "_id" carry UUIDs as 16-byte binaries.
+SUBPROTOCOL = "pollninja.msgpack.v1"
+
+
+def available() -> bool:
+    return msgpack is not None
+
+
+def negotiate(websocket: WebSocket) -> Optional[str]:
+    """Return the subprotocol to accept, or None to stay on JSON text frames."""
+    if available() and SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+        return SUBPROTOCOL
+    return None
+
+
+def _pack_uuids(value, key: Optional[str] = None):
+    if isinstance(value, dict):
+        return {k: _pack_uuids(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_pack_uuids(v) for v in value]
+    if isinstance(value, str) and key is not None and (key == "id" or key.endswith("_id")):
+        try:
+            return UUID(value).bytes
+        except ValueError:
+            return value
+    return value
+
+
+def encode(message: dict) -> bytes:
+    return msgpack.packb(_pack_uuids(message), use_bin_type=True)
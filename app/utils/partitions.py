@@ -0,0 +1,179 @@
+# app/utils/partitions.py
+import os
+import asyncio
+import argparse
+from datetime import date
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from app import db as database
+
+
+# monthly vote partitions created ahead of time, so new votes never land in
+# the default partition
+VOTE_PARTITIONS_AHEAD = int(os.getenv("VOTE_PARTITIONS_AHEAD", "3"))
+# how often running processes create upcoming partitions
+PARTITION_MAINTENANCE_SECONDS = int(os.getenv("PARTITION_MAINTENANCE_SECONDS", "3600"))
+# advisory lock taken by the one process maintaining partitions at a time
+PARTITION_LOCK_KEY = 720_311_001
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"votes_p{month:%Y%m}"
+
+
+def is_partitioned(connection) -> bool:
+    if connection.dialect.name != "postgresql":
+        return False
+    kind = connection.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass('votes')")).scalar()
+    return kind == "p"
+
+
+def _bounds(month: date) -> str:
+    return f"FROM ('{month} 00:00:00+00') TO ('{add_months(month, 1)} 00:00:00+00')"
+
+
+def create_partition(connection, month: date):
+    """Create the partition of a month, moving its rows out of votes_default first.
+
+    Postgres refuses to add a partition while the default partition holds rows
+    in its range, which happens once votes outrun the partitions created ahead.
+    """
+    name = partition_name(month)
+    if connection.execute(text("SELECT to_regclass('votes_default')")).scalar() is None:
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF votes FOR VALUES {_bounds(month)}"))
+        return
+
+    # adding a partition locks the default one anyway; taking the lock first
+    # stops new rows landing in the range between the move and the attach
+    connection.execute(text("LOCK TABLE votes_default IN ACCESS EXCLUSIVE MODE"))
+    start, end = f"{month} 00:00:00+00", f"{add_months(month, 1)} 00:00:00+00"
+    stray = connection.execute(
+        text("SELECT 1 FROM votes_default WHERE created_at >= :start AND created_at < :end LIMIT 1"),
+        {"start": start, "end": end},
+    ).first()
+    if stray is None:
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF votes FOR VALUES {_bounds(month)}"))
+        return
+
+    connection.execute(text(f"CREATE TABLE {name} (LIKE votes INCLUDING DEFAULTS)"))
+    moved = connection.execute(
+        text(
+            "WITH moved AS (DELETE FROM votes_default WHERE created_at >= :start AND created_at < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        {"start": start, "end": end},
+    ).rowcount
+    # keys, indexes and foreign keys of votes are added to the table on attach
+    connection.execute(text(f"ALTER TABLE votes ATTACH PARTITION {name} FOR VALUES {_bounds(month)}"))
+    print(f"Moved {moved} votes from votes_default into {name}")
+
+
+def monthly_partitions(connection) -> list:
+    """Attached monthly partitions of votes as (name, month), oldest first."""
+    names = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'votes'::regclass"
+    )).scalars().all()
+    partitions = []
+    for name in names:
+        suffix = name[len("votes_p"):]
+        if name.startswith("votes_p") and len(suffix) == 6 and suffix.isdigit():
+            partitions.append((name, date(int(suffix[:4]), int(suffix[4:]), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def ensure_vote_partitions(months_ahead: int = VOTE_PARTITIONS_AHEAD) -> list:
+    """Create the partitions for this month and the next few; returns the ones created.
+
+    Months whose votes already landed in votes_default get their partition
+    too. Only one process does this at a time, the others return at once.
+    """
+    created = []
+    with database.engine.begin() as connection:
+        if not is_partitioned(connection):
+            return created
+        if not connection.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY}).scalar():
+            return created
+        existing = {name for name, _ in monthly_partitions(connection)}
+        current = month_start(date.today())
+        months = {add_months(current, offset) for offset in range(months_ahead + 1)}
+        if connection.execute(text("SELECT to_regclass('votes_default')")).scalar() is not None:
+            months.update(
+                row.month.date() if hasattr(row.month, "date") else row.month
+                for row in connection.execute(text(
+                    "SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC') AS month FROM votes_default"
+                ))
+            )
+        for month in sorted(months):
+            if partition_name(month) not in existing:
+                create_partition(connection, month)
+                created.append(partition_name(month))
+    return created
+
+
+async def maintain_partitions_forever():
+    # background task started in the app lifespan; a failure is logged and
+    # retried on the next run instead of stopping the process
+    while True:
+        try:
+            created = await run_in_threadpool(ensure_vote_partitions)
+            if created:
+                print(f"Created vote partitions: {created}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Vote partition maintenance failed: {e}")
+        await asyncio.sleep(PARTITION_MAINTENANCE_SECONDS)
+
+
+def archive_vote_partitions(older_than_months: int = 12) -> list:
+    """Detach monthly partitions older than the cutoff whose polls are all closed.
+
+    Detached partitions stay as plain tables and can be dumped and dropped.
+    Closed polls are read from poll_results, so their counts are unaffected;
+    partitions still holding votes of an open poll are left attached.
+    """
+    cutoff = add_months(month_start(date.today()), -older_than_months)
+    archived = []
+    with database.engine.begin() as connection:
+        if not is_partitioned(connection):
+            return archived
+        for name, month in monthly_partitions(connection):
+            if add_months(month, 1) > cutoff:
+                break
+            open_votes = connection.execute(text(
+                f"SELECT 1 FROM {name} v JOIN polls p ON p.id = v.poll_id "
+                "WHERE p.closed_at IS NULL AND p.deleted_at IS NULL LIMIT 1"
+            )).first()
+            if open_votes:
+                print(f"Keeping {name}: it holds votes of open polls")
+                continue
+            connection.execute(text(f"ALTER TABLE votes DETACH PARTITION {name}"))
+            archived.append(name)
+            print(f"Detached {name}")
+    return archived
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the monthly partitions of the votes table.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    ensure = subcommands.add_parser("ensure", help="create partitions for the coming months")
+    ensure.add_argument("--months-ahead", type=int, default=VOTE_PARTITIONS_AHEAD)
+    archive = subcommands.add_parser("archive", help="detach old partitions of closed polls")
+    archive.add_argument("--older-than", type=int, default=12, help="age in months")
+    args = parser.parse_args()
+
+    database.init_db()
+    if args.command == "ensure":
+        print(f"Created partitions: {ensure_vote_partitions(args.months_ahead)}")
+    else:
+        print(f"Archived partitions: {archive_vote_partitions(args.older_than)}")
@@ -0,0 +1,112 @@
+# app/utils/poll_state.py
+import json
+import asyncio
+from typing import Optional
+from app.redis_pool import get_redis, record_failure, init_redis, close_redis
+
+
+# latest message of each type per poll, so processes without a database
+# (the WebSocket gateway) can send join snapshots
+STATE_KEY = "poll_state:{}"
+# order in which a joining client receives the stored messages
+STATE_TYPES = ("vote_update", "like_update", "poll_closed")
+
+
+# stores each message only if its version is newer than the stored one
+# (kept in a "<type>:version" field), so a broadcast delayed behind a later
+# one can't overwrite it; returns how many were stored
+SAVE_SCRIPT = """
+local stored = 0
+for i = 2, #ARGV, 2 do
+    local current = tonumber(redis.call('HGET', KEYS[1], ARGV[i] .. ':version') or '-1')
+    if tonumber(ARGV[1]) > current then
+        redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1], ARGV[i] .. ':version', ARGV[1])
+        stored = stored + 1
+    end
+end
+return stored
+"""
+
+
+class StateUnavailable(Exception):
+    """Redis could not be reached, so the state of a poll is unknown."""
+
+
+async def save(poll_id, version: Optional[int], *messages: dict):
+    """Store the given messages as the poll's latest state, one field per type.
+
+    `version` is the poll's snapshot version read before the messages were
+    built; messages older than the stored ones are dropped. Nothing is stored
+    without a version.
+    """
+    redis_conn = await get_redis()
+    if not redis_conn or version is None:
+        return
+    args = [version]
+    for message in messages:
+        args += [message["type"], json.dumps(message)]
+    try:
+        await redis_conn.eval(SAVE_SCRIPT, 1, STATE_KEY.format(poll_id), *args)
+    except Exception as e:
+        print(f"Failed to store state of poll {poll_id}: {e}")
+        record_failure(e)
+
+
+async def load(poll_id) -> Optional[list]:
+    """Stored messages of a poll in STATE_TYPES order; None for an unknown poll."""
+    redis_conn = await get_redis()
+    if not redis_conn:
+        raise StateUnavailable()
+    try:
+        state = await redis_conn.hgetall(STATE_KEY.format(poll_id))
+    except Exception as e:
+        record_failure(e)
+        raise StateUnavailable() from e
+    if not state:
+        return None
+    return [json.loads(state[kind]) for kind in STATE_TYPES if kind in state]
+
+
+async def clear(poll_id):
+    redis_conn = await get_redis()
+    if not redis_conn:
+        return
+    try:
+        await redis_conn.delete(STATE_KEY.format(poll_id))
+    except Exception as e:
+        print(f"Failed to clear state of poll {poll_id}: {e}")
+        record_failure(e)
+
+
+async def backfill():
+    """Store the state of every live poll, e.g. before the first gateway deploy."""
+    # imported here because app.routes.ws imports this module
+    from starlette.concurrency import run_in_threadpool
+    from app.db import init_db, sessionlocal
+    from app import models
+    from app.routes.ws import vote_update_message
+    from app.utils.closing import closed_message, results_data
+    from app.utils.snapshot_cache import poll_version
+
+    await run_in_threadpool(init_db)
+    await init_redis()
+    db = sessionlocal()
+    try:
+        polls = db.query(models.Poll).filter(models.Poll.deleted_at.is_(None)).all()
+        for poll in polls:
+            version = await poll_version(poll.id)
+            messages = [
+                vote_update_message(db, poll.id),
+                {"type": "like_update", "poll_id": str(poll.id), "likes": poll.likes_count or 0},
+            ]
+            if poll.result is not None:
+                messages.append(closed_message(results_data(poll.result)))
+            await save(poll.id, version, *messages)
+        print(f"Stored state of {len(polls)} polls")
+    finally:
+        db.close()
+        await close_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
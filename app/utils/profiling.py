@@ -0,0 +1,299 @@
+# app/utils/profiling.py
+import os
+import sys
+import time
+import uuid
+import random
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer
+except ImportError:  # sampling profiles are optional, SQL timings work without it
+    Profiler = None
+
+
+# nothing is installed unless enabled, so the default costs nothing per request
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# fraction of requests profiled without the X-Profile header
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+# entries kept in each ring buffer
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "100"))
+
+PROFILE_HEADER = "x-profile"
+# statements are stored truncated, without parameters
+MAX_STATEMENT_LENGTH = 1000
+# application frames kept per call site
+CALL_SITE_DEPTH = 3
+# statements kept per request; an N+1 loop is still counted past this
+MAX_QUERIES_PER_REQUEST = 500
+# how long a user's role is trusted before X-Profile looks it up again
+ADMIN_ROLE_TTL_SECONDS = 30
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+profiles: deque = deque(maxlen=PROFILE_BUFFER_SIZE)
+slow_queries: deque = deque(maxlen=PROFILE_BUFFER_SIZE)
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """Timings collected for one HTTP request."""
+
+    def __init__(self, method: str, path: str, reason: Optional[str]):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        # "header" or "sampled" when the request is fully profiled, else None
+        self.reason = reason
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.duration_ms = None
+        self.status = None
+        self.queries = []
+        self.query_count = 0
+        self.sql_ms = 0.0
+        self.spans = {}
+        self.session = None
+
+    @property
+    def profiled(self) -> bool:
+        return self.reason is not None
+
+    def add_span(self, name: str, elapsed_ms: float):
+        count, total = self.spans.get(name, (0, 0.0))
+        self.spans[name] = (count + 1, total + elapsed_ms)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "reason": self.reason or "slow",
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "query_count": self.query_count,
+            "sql_ms": round(self.sql_ms, 3),
+        }
+
+    def detail(self) -> dict:
+        return {
+            **self.summary(),
+            "spans": {
+                name: {"count": count, "total_ms": round(total, 3)}
+                for name, (count, total) in sorted(self.spans.items(), key=lambda item: -item[1][1])
+            },
+            "queries": self.queries,
+            "profile": render(self, "text"),
+        }
+
+
+@contextmanager
+def span(name: str):
+    """Add the time spent in the block to the current request's breakdown."""
+    record = _current.get()
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.add_span(name, (time.perf_counter() - start) * 1000)
+
+
+def call_site() -> list:
+    # innermost application frames, skipping this module
+    frames = []
+    frame = sys._getframe(2)
+    while frame is not None and len(frames) < CALL_SITE_DEPTH:
+        filename = frame.f_code.co_filename
+        if filename.startswith(APP_DIR) and filename != __file__:
+            frames.append(f"{os.path.relpath(filename, os.path.dirname(APP_DIR))}:{frame.f_lineno} in {frame.f_code.co_name}")
+        frame = frame.f_back
+    return frames
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    record = _current.get()
+    slow = elapsed_ms >= SLOW_QUERY_MS
+    if record is None and not slow:
+        return
+
+    query = {
+        "statement": statement[:MAX_STATEMENT_LENGTH],
+        "duration_ms": round(elapsed_ms, 3),
+        "executemany": executemany,
+    }
+    # walking the stack is the expensive part, so only slow or profiled queries get a call site
+    if slow or (record is not None and record.profiled):
+        query["call_site"] = call_site()
+    if record is not None:
+        record.query_count += 1
+        record.sql_ms += elapsed_ms
+        if len(record.queries) < MAX_QUERIES_PER_REQUEST:
+            record.queries.append(query)
+    if slow:
+        slow_queries.append({
+            **query,
+            "request_id": record.id if record is not None else None,
+            "path": record.path if record is not None else None,
+            "at": datetime.now(timezone.utc),
+        })
+
+
+def _time_pool_checkout(pool):
+    # time spent waiting for a pooled connection, reported as "db.pool_wait"
+    connect = pool.connect
+
+    def timed_connect():
+        with span("db.pool_wait"):
+            return connect()
+
+    pool.connect = timed_connect
+
+
+def install(engine=None):
+    """Register the SQL timing hooks; called once from the app lifespan."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    if engine is not None:
+        _time_pool_checkout(engine.pool)
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+# user id -> (is admin, monotonic time looked up)
+_admin_roles: dict = {}
+
+
+def _load_is_admin(user_id) -> bool:
+    # the role column, as check_admin_role reads it, not the token's claim,
+    # which outlives a demotion until the token expires
+    from app.db import sessionlocal
+    from app.models import User
+    db = sessionlocal()
+    try:
+        user = db.query(User.role).filter(User.id == user_id).first()
+        return user is not None and str(user.role) == "admin"
+    finally:
+        db.close()
+
+
+async def _requested_by_admin(scope) -> bool:
+    # the X-Profile header is only honoured for admin users
+    if _header(scope, PROFILE_HEADER.encode()) is None:
+        return False
+    authorization = _header(scope, b"authorization") or ""
+    if not authorization.lower().startswith("bearer "):
+        return False
+    from app.utils.auth import decode_access_token
+    try:
+        user_id = str(uuid.UUID(decode_access_token(authorization[7:])["user_id"]))
+    except Exception:
+        return False
+
+    cached = _admin_roles.get(user_id)
+    if cached is not None and time.monotonic() - cached[1] < ADMIN_ROLE_TTL_SECONDS:
+        return cached[0]
+    try:
+        is_admin = await run_in_threadpool(_load_is_admin, user_id)
+    except Exception as e:
+        print(f"Profiling admin check failed: {e}")
+        return False
+    if len(_admin_roles) >= PROFILE_BUFFER_SIZE:
+        _admin_roles.clear()
+    _admin_roles[user_id] = (is_admin, time.monotonic())
+    return is_admin
+
+
+class ProfilingMiddleware:
+    """Times every request and fully profiles requested or sampled ones.
+
+    Profiled requests, and any request slower than SLOW_REQUEST_MS, are kept
+    in the `profiles` ring buffer and answered with an X-Profile-Id header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        reason = None
+        if await _requested_by_admin(scope):
+            reason = "header"
+        elif PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            reason = "sampled"
+
+        record = RequestProfile(scope["method"], scope["path"], reason)
+        token = _current.set(record)
+        streaming = False
+
+        profiler = None
+        if record.profiled and Profiler is not None:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+
+        async def send_wrapper(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start":
+                record.status = message["status"]
+                headers = list(message.get("headers", []))
+                # long-lived event streams are not "slow requests"
+                streaming = any(key == b"content-type" and value.startswith(b"text/event-stream") for key, value in headers)
+                if record.profiled:
+                    headers.append((b"x-profile-id", record.id.encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                profiler.stop()
+                record.session = profiler.last_session
+            record.duration_ms = (time.perf_counter() - record.start) * 1000
+            _current.reset(token)
+            if record.profiled or (record.duration_ms >= SLOW_REQUEST_MS and not streaming):
+                profiles.append(record)
+
+
+def find(profile_id: str) -> Optional[RequestProfile]:
+    for record in profiles:
+        if record.id == profile_id:
+            return record
+    return None
+
+
+def render(record: RequestProfile, format: str = "text") -> Optional[str]:
+    """The sampling profile of a request as text or HTML; None if none was taken."""
+    if record.session is None:
+        return None
+    if format == "html":
+        return HTMLRenderer().render(record.session)
+    return ConsoleRenderer(unicode=True, color=False).render(record.session)
@@ -0,0 +1,75 @@
+# app/utils/purge.py
+from sqlalchemy import delete, select
+from app.db import sessionlocal, init_db
+from app import models
+
+
+# rows removed per statement; keeps each transaction and its locks small
+PURGE_BATCH_SIZE = 5000
+
+
+def _delete_in_batches(db, model, poll_id, batch_size: int) -> int:
+    # delete children of a poll a batch at a time, committing after each one
+    total = 0
+    while True:
+        batch = select(model.id).where(model.poll_id == poll_id).limit(batch_size)
+        result = db.execute(
+            delete(model)
+            .where(model.id.in_(batch))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        total += result.rowcount or 0
+        if not result.rowcount or result.rowcount < batch_size:
+            return total
+
+
+def purge_poll(poll_id, batch_size: int = PURGE_BATCH_SIZE):
+    """Remove a soft-deleted poll together with its votes, ballots, likes and options."""
+    db = sessionlocal()
+    try:
+        poll = db.query(models.Poll.id).filter(
+            models.Poll.id == poll_id,
+            models.Poll.deleted_at.isnot(None),
+        ).first()
+        if not poll:
+            return
+
+        votes = _delete_in_batches(db, models.Vote, poll_id, batch_size)
+        likes = _delete_in_batches(db, models.Like, poll_id, batch_size)
+        ballots = _delete_in_batches(db, models.Ballot, poll_id, batch_size)
+        options = _delete_in_batches(db, models.Option, poll_id, batch_size)
+
+        # anything left over is removed by the ON DELETE CASCADE foreign keys
+        db.execute(
+            delete(models.Poll)
+            .where(models.Poll.id == poll_id, models.Poll.deleted_at.isnot(None))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        print(f"Purged poll {poll_id}: {votes} votes, {ballots} ballots, {likes} likes, {options} options")
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to purge poll {poll_id}: {e}")
+    finally:
+        db.close()
+
+
+def purge_deleted_polls(batch_size: int = PURGE_BATCH_SIZE):
+    """Purge every soft-deleted poll, e.g. ones left behind by a restart."""
+    db = sessionlocal()
+    try:
+        poll_ids = [
+            row.id for row in
+            db.query(models.Poll.id).filter(models.Poll.deleted_at.isnot(None)).all()
+        ]
+    finally:
+        db.close()
+
+    for poll_id in poll_ids:
+        purge_poll(poll_id, batch_size)
+
+
+if __name__ == "__main__":
+    init_db()
+    purge_deleted_polls()
@@ -0,0 +1,315 @@
+# app/utils/search.py
+import os
+import re
+import base64
+import threading
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+from fastapi import HTTPException
+from sqlalchemy import func, literal_column, tuple_, cast, text
+from sqlalchemy.types import REAL
+from sqlalchemy.orm import Session
+from app import models
+
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# matches ranked per query: terms matching more polls are ranked within their
+# SEARCH_CANDIDATE_LIMIT most recent matches
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "1000"))
+# most recent polls probed to tell broad terms from rare ones before choosing
+# between walking ix_polls_recent and reading the GIN index
+SEARCH_SCAN_LIMIT = int(os.getenv("SEARCH_SCAN_LIMIT", "10000"))
+
+# same weighting as the Postgres search_vector column: title A, description B
+TITLE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "this", "to", "was", "what", "which",
+    "who", "will", "with",
+}
+
+
+def encode_cursor(rank: float, poll_id, newest: Optional[tuple] = None) -> str:
+    value = f"{rank!r}:{poll_id}"
+    if newest is not None:
+        # (created_at, id) of the newest candidate ranked for the first page
+        value += f"|{newest[0].isoformat()}|{newest[1]}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """(rank, poll id, newest candidate or None) of a cursor."""
+    try:
+        value, *newest = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        rank, poll_id = value.split(":", 1)
+        if newest:
+            created_at, newest_id = newest
+            newest = (datetime.fromisoformat(created_at), str(UUID(newest_id)))
+        return float(rank), str(UUID(poll_id)), newest or None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _stem(token: str) -> str:
+    # crude plural folding so "pets" matches "pet", like the english config does
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> list:
+    if not text:
+        return []
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def parse_query(q: str):
+    # websearch-style query: every word must match, words prefixed with "-" must not
+    required, excluded = set(), set()
+    for word in q.split():
+        if word.startswith("-"):
+            excluded.update(tokenize(word[1:]))
+        else:
+            required.update(tokenize(word))
+    return required, excluded
+
+
+class InvertedIndex:
+    """In-process full-text index used when the database is not Postgres.
+
+    Built from the polls table on first use and kept up to date by the poll
+    create/delete routes. Queries match polls containing every term.
+    """
+
+    def __init__(self):
+        self.built = False
+        self._postings: dict = {}
+        self._docs: dict = {}
+        self._lock = threading.Lock()
+
+    def add(self, poll_id, title: str, description: Optional[str], created_at, created_by: str):
+        poll_id = str(poll_id)
+        weights: dict = {}
+        for token in tokenize(title):
+            weights[token] = weights.get(token, 0.0) + TITLE_WEIGHT
+        for token in tokenize(description):
+            weights[token] = weights.get(token, 0.0) + DESCRIPTION_WEIGHT
+
+        with self._lock:
+            self._docs[poll_id] = {
+                "id": poll_id,
+                "title": title,
+                "description": description,
+                "created_at": created_at,
+                "created_by": created_by,
+                "terms": list(weights),
+            }
+            for token, weight in weights.items():
+                self._postings.setdefault(token, {})[poll_id] = weight
+
+    def remove(self, poll_id):
+        poll_id = str(poll_id)
+        with self._lock:
+            doc = self._docs.pop(poll_id, None)
+            if doc is None:
+                return
+            for token in doc["terms"]:
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.pop(poll_id, None)
+                    if not postings:
+                        del self._postings[token]
+
+    def build(self, db: Session):
+        polls = (
+            db.query(models.Poll.id, models.Poll.title, models.Poll.description, models.Poll.created_at, models.Poll.created_by)
+            .filter(models.Poll.deleted_at.is_(None))
+            .all()
+        )
+        for poll in polls:
+            self.add(poll.id, poll.title, poll.description, poll.created_at, poll.created_by)
+        self.built = True
+
+    def search(self, q: str, limit: int, after=None) -> list:
+        terms, excluded = parse_query(q)
+        if not terms:
+            return []
+
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in terms]
+            # intersect starting from the rarest term
+            postings.sort(key=len)
+            scores = {}
+            for poll_id, weight in postings[0].items():
+                total = weight
+                for other in postings[1:]:
+                    if poll_id not in other:
+                        break
+                    total += other[poll_id]
+                else:
+                    if not any(poll_id in self._postings.get(term, ()) for term in excluded):
+                        scores[poll_id] = total
+            ranked = sorted(scores.items(), key=lambda item: (item[1], item[0]), reverse=True)
+
+            results = []
+            for poll_id, rank in ranked:
+                if after is not None and (rank, poll_id) >= after[:2]:
+                    continue
+                results.append({**{k: v for k, v in self._docs[poll_id].items() if k != "terms"}, "rank": rank})
+                if len(results) == limit:
+                    break
+        return results
+
+
+fallback_index = InvertedIndex()
+
+
+def is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+_search_vector_present: Optional[bool] = None
+
+
+def has_search_vector(db: Session) -> bool:
+    """True if polls has the search_vector column, which only the migration adds.
+
+    A present column is remembered per process; a missing one is checked
+    again on the next search, so running the migration needs no restart.
+    """
+    global _search_vector_present
+    if not _search_vector_present:
+        _search_vector_present = db.execute(text(
+            "SELECT 1 FROM information_schema.columns "
+            "WHERE table_name = 'polls' AND column_name = 'search_vector'"
+        )).first() is not None
+    return _search_vector_present
+
+
+def _search_postgres(db: Session, q: str, limit: int, after=None):
+    """(page, newest candidate) of a Postgres search.
+
+    Ranking reads every tsvector it scores, so only the SEARCH_CANDIDATE_LIMIT
+    most recent matches are ranked. The cursor carries the newest candidate
+    of the first page, so later pages rank the same polls instead of
+    shifting when new polls are created.
+    """
+    search_vector = literal_column("polls.search_vector")
+    query = func.websearch_to_tsquery("english", q)
+    newest = after[2] if after is not None else None
+
+    def matching(*columns):
+        rows = db.query(*columns).filter(models.Poll.deleted_at.is_(None))
+        if newest is not None:
+            rows = rows.filter(
+                tuple_(models.Poll.created_at, models.Poll.id) <= tuple_(newest[0], cast(newest[1], models.Poll.id.type))
+            )
+        return rows
+
+    columns = (
+        models.Poll.id,
+        models.Poll.title,
+        models.Poll.description,
+        models.Poll.created_at,
+        models.Poll.created_by,
+        search_vector.label("search_vector"),
+    )
+    recent = (
+        matching(*columns)
+        .order_by(models.Poll.created_at.desc(), models.Poll.id.desc())
+        .limit(SEARCH_SCAN_LIMIT)
+        .subquery()
+    )
+    recent_matches = (
+        db.query(*recent.c)
+        .filter(recent.c.search_vector.op("@@")(query))
+        .order_by(recent.c.created_at.desc(), recent.c.id.desc())
+        .limit(SEARCH_CANDIDATE_LIMIT)
+    )
+    # every branch selects the same polls, the most recent matches; they only
+    # differ in how Postgres finds them. The planner estimates single terms
+    # well, but assumes unrelated terms occur together, so for several terms
+    # it may walk the whole table looking for matches that never come; the
+    # recent polls are probed first to see how often the terms really match.
+    found = None
+    if len(parse_query(q)[0]) > 1:
+        found = db.query(func.count()).select_from(recent_matches.with_entities(recent.c.id).subquery()).scalar()
+    if found == SEARCH_CANDIDATE_LIMIT:
+        candidates = recent_matches.subquery()
+    else:
+        order = models.Poll.created_at.desc()
+        if found is not None and found * 10 < SEARCH_CANDIDATE_LIMIT:
+            # a walk would read over ten times SEARCH_SCAN_LIMIT polls: sort
+            # what the GIN index finds instead
+            order = (models.Poll.created_at + literal_column("interval '0'")).desc()
+        candidates = (
+            matching(*columns)
+            .filter(search_vector.op("@@")(query))
+            .order_by(order, models.Poll.id.desc())
+            .limit(SEARCH_CANDIDATE_LIMIT)
+            .subquery()
+        )
+    rank = func.ts_rank(candidates.c.search_vector, query)
+    recency = (candidates.c.created_at.desc(), candidates.c.id.desc())
+
+    rows = db.query(
+        candidates.c.id,
+        candidates.c.title,
+        candidates.c.description,
+        candidates.c.created_at,
+        candidates.c.created_by,
+        rank.label("rank"),
+        func.first_value(candidates.c.created_at).over(order_by=recency).label("newest_created_at"),
+        func.first_value(candidates.c.id).over(order_by=recency).label("newest_id"),
+    )
+    if after is not None:
+        # keyset pagination: continue strictly after the last (rank, id) returned
+        rows = rows.filter(tuple_(rank, candidates.c.id) < tuple_(cast(after[0], REAL), cast(after[1], models.Poll.id.type)))
+    rows = rows.order_by(rank.desc(), candidates.c.id.desc()).limit(limit).all()
+
+    if newest is None and rows:
+        newest = (rows[0].newest_created_at, str(rows[0].newest_id))
+    results = [
+        {
+            "id": str(row.id),
+            "title": row.title,
+            "description": row.description,
+            "created_at": row.created_at,
+            "created_by": row.created_by,
+            "rank": row.rank,
+        }
+        for row in rows
+    ]
+    return results, newest
+
+
+def search_polls(db: Session, q: str, limit: int = SEARCH_DEFAULT_LIMIT, cursor: Optional[str] = None) -> dict:
+    """Ranked full-text search over poll titles and descriptions, one page at a time."""
+    after = decode_cursor(cursor) if cursor else None
+
+    # fetch one extra row to know whether there is a next page
+    if is_postgres(db):
+        if not has_search_vector(db):
+            # the in-process index only follows this worker's writes, so it
+            # would serve stale results next to other workers
+            print("polls.search_vector is missing, run the migrations to enable search")
+            raise HTTPException(status_code=503, detail="Search is not available")
+        results, newest = _search_postgres(db, q, limit + 1, after)
+    else:
+        if not fallback_index.built:
+            fallback_index.build(db)
+        results, newest = fallback_index.search(q, limit + 1, after), None
+
+    next_cursor = None
+    if len(results) > limit:
+        results = results[:limit]
+        last = results[-1]
+        next_cursor = encode_cursor(last["rank"], last["id"], newest)
+    return {"results": results, "next_cursor": next_cursor}
@@ -0,0 +1,150 @@
+# app/utils/snapshot_cache.py
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Optional
+from starlette.concurrency import run_in_threadpool
+from app.redis_pool import get_redis, record_failure
+from app.utils.compression import CompressedBody
+
+
+# number of rendered snapshots kept per process
+SNAPSHOT_CACHE_SIZE = 1024
+# upper bound on entry age, covers writes missed while Redis was unreachable
+SNAPSHOT_MAX_AGE = 30
+
+GLOBAL_VERSION_KEY = "snapshots:version"
+_local_versions: dict = {}
+# computation tasks in progress, keyed by (key, version)
+_inflight: dict = {}
+
+
+def _poll_version_key(poll_id) -> str:
+    return f"snapshots:version:{poll_id}"
+
+
+class SnapshotCache:
+    """LRU of poll snapshots keyed by name and data version."""
+
+    def __init__(self, maxsize: int = SNAPSHOT_CACHE_SIZE, max_age: float = SNAPSHOT_MAX_AGE):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str, version):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry_version, created, value = entry
+        if entry_version != version or time.monotonic() - created > self.max_age:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, version, value):
+        self._entries[key] = (version, time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+snapshot_cache = SnapshotCache()
+
+
+async def current_version(version_key: str):
+    """("redis", n), or ("local", n) counting this process's writes if Redis can't be read."""
+    # versions live in Redis so a write on any instance invalidates every cache
+    redis_conn = await get_redis()
+    if redis_conn:
+        try:
+            return ("redis", int(await redis_conn.get(version_key) or 0))
+        except Exception as e:
+            print(f"Snapshot version lookup failed: {e}")
+            record_failure(e)
+    return ("local", _local_versions.get(version_key, 0))
+
+
+async def poll_version(poll_id) -> Optional[int]:
+    """The poll's version in Redis, which orders the writes to it; None if Redis can't be read."""
+    source, version = await current_version(_poll_version_key(poll_id))
+    return version if source == "redis" else None
+
+
+async def bump_version(version_key: str):
+    """Increment a version key; returns the new version as current_version does."""
+    _local_versions[version_key] = _local_versions.get(version_key, 0) + 1
+    redis_conn = await get_redis()
+    if redis_conn:
+        try:
+            return ("redis", int(await redis_conn.incr(version_key)))
+        except Exception as e:
+            print(f"Version bump failed: {e}")
+            record_failure(e)
+    return ("local", _local_versions[version_key])
+
+
+async def invalidate(poll_id=None):
+    """Mark the poll list (and a single poll, if given) as changed."""
+    keys = [GLOBAL_VERSION_KEY]
+    if poll_id is not None:
+        keys.append(_poll_version_key(poll_id))
+
+    for key in keys:
+        _local_versions[key] = _local_versions.get(key, 0) + 1
+
+    redis_conn = await get_redis()
+    if redis_conn:
+        try:
+            pipe = redis_conn.pipeline(transaction=False)
+            for key in keys:
+                pipe.incr(key)
+            await pipe.execute()
+        except Exception as e:
+            print(f"Snapshot invalidation failed: {e}")
+            record_failure(e)
+
+
+async def get_or_compute(key: str, compute, poll_id=None):
+    """Return the cached value for key, computing it with compute() on a miss.
+
+    compute is a blocking function and runs in the threadpool. Concurrent
+    misses for the same key share a single computation.
+    """
+    version_key = _poll_version_key(poll_id) if poll_id is not None else GLOBAL_VERSION_KEY
+    version = await current_version(version_key)
+    value = snapshot_cache.get(key, version)
+    if value is not None:
+        return value
+
+    inflight_key = (key, version)
+    task = _inflight.get(inflight_key)
+    if task is None:
+        # the computation is its own task, so a caller that is cancelled (a
+        # client disconnecting mid-join) does not cancel it for the others
+        task = asyncio.ensure_future(_compute(key, version, compute))
+        _inflight[inflight_key] = task
+        task.add_done_callback(lambda done: _finish(inflight_key, done))
+    return await asyncio.shield(task)
+
+
+async def _compute(key: str, version, compute):
+    value = await run_in_threadpool(compute)
+    snapshot_cache.put(key, version, value)
+    return value
+
+
+def _finish(inflight_key, task):
+    if _inflight.get(inflight_key) is task:
+        del _inflight[inflight_key]
+    # mark retrieved so a failure nobody awaited any more is not logged
+    if not task.cancelled():
+        task.exception()
+
+
+async def get_or_build(key: str, build, poll_id=None) -> CompressedBody:
+    """Return the cached body for key, rendering it with build() on a miss.
+
+    build is a blocking function returning JSON bytes.
+    """
+    return await get_or_compute(key, lambda: CompressedBody(build()), poll_id=poll_id)
@@ -0,0 +1,347 @@
+# app/utils/tally.py
+# Tallies for multi-select and ranked-choice polls. Ballots are loaded into a
+# padded matrix of option positions and counted with NumPy, with no per-ballot
+# Python loops; instant-runoff only revisits the ballots of eliminated options.
+import time
+import asyncio
+import itertools
+import weakref
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from app.db import sessionlocal
+from app import models
+from app.utils import snapshot_cache
+
+
+METHODS = ("single", "multi", "ranked")
+# polls whose ballots are kept in memory per process
+TALLY_CACHE_SIZE = 16
+# padding after the last choice of a ballot
+EMPTY = -1
+# bumped after every ballot, so cached tallies on all instances notice it
+BALLOT_VERSION_KEY = "ballots:version:{}"
+
+
+def pad_ballots(lengths: np.ndarray, flat: np.ndarray, width: int) -> np.ndarray:
+    """Ballots given as lengths and concatenated choices, as an (n, width) int16 matrix padded with -1."""
+    n, total = len(lengths), len(flat)
+    matrix = np.full((n, width), EMPTY, dtype=np.int16)
+    # scatter each choice to its row and its index within the ballot
+    rows = np.repeat(np.arange(n), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    matrix[rows, np.arange(total) - starts] = flat
+    return matrix
+
+
+def ballot_matrix(choices: list, width: int) -> np.ndarray:
+    """Ballots (lists of option positions) as an (n, width) int16 matrix padded with -1."""
+    lengths = np.fromiter(map(len, choices), dtype=np.int64, count=len(choices))
+    flat = np.fromiter(itertools.chain.from_iterable(choices), dtype=np.int16, count=int(lengths.sum()))
+    return pad_ballots(lengths, flat, width)
+
+
+def approval_counts(ballots: np.ndarray, n_options: int) -> np.ndarray:
+    """Ballots choosing each option, for multi-select polls."""
+    choices = ballots[ballots != EMPTY]
+    return np.bincount(choices, minlength=n_options)[:n_options]
+
+
+def instant_runoff(ballots: np.ndarray, n_options: int) -> dict:
+    """Instant-runoff rounds over a ballot matrix of ranked option positions.
+
+    Each round the option with the fewest votes is eliminated and its ballots
+    move to their next choice still in the race, until one option holds a
+    majority of the ballots that are not exhausted. Ties for elimination go to
+    the option with fewer first choices, then to the later option.
+    """
+    n, width = ballots.shape
+    active = np.ones(n_options, dtype=bool)
+    # column of the choice each ballot currently counts for
+    cursor = np.zeros(n, dtype=np.int64)
+    current = ballots[:, 0].astype(np.int64) if width else np.full(n, EMPTY, dtype=np.int64)
+    counts = np.bincount(current[current != EMPTY], minlength=n_options)[:n_options]
+    first_choices = counts.copy()
+
+    rounds, winner = [], None
+    while True:
+        remaining = np.flatnonzero(active)
+        continuing = int(counts[remaining].sum())
+        round_ = {"counts": counts.copy(), "exhausted": n - continuing, "eliminated": None}
+        rounds.append(round_)
+        if continuing == 0 or len(remaining) == 0:
+            break
+        leader = remaining[np.argmax(counts[remaining])]
+        if counts[leader] * 2 > continuing or len(remaining) == 1:
+            winner = int(leader)
+            break
+
+        fewest = counts[remaining].min()
+        tied = remaining[counts[remaining] == fewest]
+        if len(tied) > 1:
+            tied = tied[first_choices[tied] == first_choices[tied].min()]
+        loser = int(tied[-1])
+        round_["eliminated"] = loser
+        active[loser] = False
+        counts[loser] = 0
+
+        # advance the loser's ballots past every choice that is out of the race
+        moved = np.flatnonzero(current == loser)
+        pending = moved
+        while len(pending):
+            cursor[pending] += 1
+            ended = cursor[pending] >= width
+            current[pending[ended]] = EMPTY
+            pending = pending[~ended]
+            following = ballots[pending, cursor[pending]].astype(np.int64)
+            current[pending] = following
+            pending = pending[(following != EMPTY) & ~active[np.maximum(following, 0)]]
+        transferred = current[moved]
+        counts += np.bincount(transferred[transferred != EMPTY], minlength=n_options)[:n_options]
+
+    return {"rounds": rounds, "winner": winner}
+
+
+def compute(method: str, ballots: np.ndarray, option_ids: list) -> dict:
+    """Results of a ballot matrix, keyed by option id (string)."""
+    n_options = len(option_ids)
+    if method == "ranked":
+        runoff = instant_runoff(ballots, n_options)
+        rounds = [
+            {
+                "counts": {option_ids[i]: int(count) for i, count in enumerate(round_["counts"])},
+                "exhausted": round_["exhausted"],
+                "eliminated": option_ids[round_["eliminated"]] if round_["eliminated"] is not None else None,
+            }
+            for round_ in runoff["rounds"]
+        ]
+        winner = option_ids[runoff["winner"]] if runoff["winner"] is not None else None
+        # the final round is the result
+        return {"total_ballots": len(ballots), "tallies": rounds[-1]["counts"], "rounds": rounds, "winner": winner}
+
+    counts = approval_counts(ballots, n_options)
+    return {
+        "total_ballots": len(ballots),
+        "tallies": {option_ids[i]: int(count) for i, count in enumerate(counts)},
+        "rounds": None,
+        "winner": None,
+    }
+
+
+def parse_snapshot(value: str) -> tuple:
+    """(xmin, xmax, in-progress xids) of a pg_current_snapshot() text."""
+    xmin, xmax, in_progress = value.split(":")
+    return int(xmin), int(xmax), frozenset(int(xid) for xid in in_progress.split(",") if xid)
+
+
+def is_visible(snapshot: tuple, xid: int) -> bool:
+    """Whether the rows written by transaction xid are part of a snapshot."""
+    xmin, xmax, in_progress = snapshot
+    return xid < xmin or (xid < xmax and xid not in in_progress)
+
+
+def load_ballots(db, poll_id):
+    """(snapshot, option ids by position, ballot matrix) of a poll.
+
+    The ballots are read together with the database snapshot they come from,
+    so a ballot recorded later can be checked against it. Ballots arrive as
+    two comma-separated strings, lengths and choices, aggregated in the same
+    row order; parsing them is several times faster than a Python list per
+    row.
+    """
+    options = (
+        db.query(models.Option.id)
+        .filter(models.Option.poll_id == poll_id)
+        .order_by(models.Option.position, models.Option.id)
+        .all()
+    )
+    option_ids = [str(row.id) for row in options]
+    snapshot, lengths, choices = db.execute(
+        text("""
+            SELECT pg_current_snapshot()::text,
+                   string_agg(cardinality(choices)::text, ','),
+                   string_agg(array_to_string(choices, ','), ',')
+            FROM ballots WHERE poll_id = :poll_id
+        """),
+        {"poll_id": str(poll_id)},
+    ).one()
+    snapshot = parse_snapshot(snapshot)
+    if not lengths:
+        return snapshot, option_ids, np.full((0, 1), EMPTY, dtype=np.int16)
+    lengths = np.fromstring(lengths, dtype=np.int64, sep=",")
+    choices = np.fromstring(choices, dtype=np.int16, sep=",")
+    return snapshot, option_ids, pad_ballots(lengths, choices, max(int(lengths.max()), 1))
+
+
+def preference_counts(db, poll_id, method: str) -> dict:
+    """Votes shown per option position in poll listings, counted in SQL.
+
+    Multi-select polls show approvals; ranked polls show first choices, the
+    runoff itself is served by the results endpoint.
+    """
+    if method == "multi":
+        # a set-returning function can't be grouped by, so unnest in FROM
+        query = """
+            SELECT c.position, count(*) FROM ballots
+            CROSS JOIN LATERAL unnest(ballots.choices) AS c(position)
+            WHERE ballots.poll_id = :poll_id
+            GROUP BY c.position
+        """
+    else:
+        query = """
+            SELECT choices[1] AS position, count(*) FROM ballots
+            WHERE poll_id = :poll_id
+            GROUP BY choices[1]
+        """
+    rows = db.execute(text(query), {"poll_id": str(poll_id)}).all()
+    return {position: count for position, count in rows}
+
+
+class PollTally:
+    """Ballots of one poll held in memory.
+
+    `version` is the poll's ballot version read before loading, `snapshot`
+    the database snapshot the ballots were read in.
+    """
+
+    def __init__(self, method: str, option_ids: list, ballots: np.ndarray, version=None, snapshot: Optional[tuple] = None):
+        self.method = method
+        self.version = version
+        self.snapshot = snapshot
+        self.loaded_at = time.monotonic()
+        self.option_ids = option_ids
+        # rows past self.size are spare capacity for appended ballots
+        self._ballots = ballots
+        self.size = len(ballots)
+        self.counts = approval_counts(ballots, len(option_ids)) if method == "multi" else None
+        self.results = None
+
+    @property
+    def ballots(self) -> np.ndarray:
+        return self._ballots[:self.size]
+
+    def add(self, positions: list):
+        if self.method == "multi":
+            # approvals are additive, so counts stay current without a recount
+            self.counts[positions] += 1
+        else:
+            if self.size == len(self._ballots) or len(positions) > self._ballots.shape[1]:
+                grown = np.full(
+                    (max(16, len(self._ballots) * 2), max(self._ballots.shape[1], len(positions))),
+                    EMPTY, dtype=np.int16,
+                )
+                grown[:self.size, :self._ballots.shape[1]] = self.ballots
+                self._ballots = grown
+            self._ballots[self.size, :len(positions)] = positions
+        self.size += 1
+        self.results = None
+
+    def compute(self) -> dict:
+        if self.results is not None:
+            return self.results
+        size = self.size
+        if self.method == "multi":
+            results = {
+                "total_ballots": size,
+                "tallies": {option_id: int(count) for option_id, count in zip(self.option_ids, self.counts)},
+                "rounds": None,
+                "winner": None,
+            }
+        else:
+            results = compute(self.method, self.ballots, self.option_ids)
+        # a ballot added while computing makes these results stale
+        if self.size == size:
+            self.results = results
+        return results
+
+
+_tallies: "OrderedDict[str, PollTally]" = OrderedDict()
+# a lock lives only while a request holds it or waits on it
+_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _load(poll_id, method: str, version) -> PollTally:
+    db = sessionlocal()
+    try:
+        snapshot, option_ids, ballots = load_ballots(db, poll_id)
+    finally:
+        db.close()
+    return PollTally(method, option_ids, ballots, version, snapshot)
+
+
+def _is_current(tally: PollTally, method: str, version) -> bool:
+    if tally.method != method or tally.version != version:
+        return False
+    # a local version only counts this process's ballots, so bound the age
+    # as the snapshot cache does
+    return version[0] == "redis" or time.monotonic() - tally.loaded_at <= snapshot_cache.SNAPSHOT_MAX_AGE
+
+
+def _store(key: str, tally: PollTally):
+    _tallies[key] = tally
+    _tallies.move_to_end(key)
+    while len(_tallies) > TALLY_CACHE_SIZE:
+        _tallies.popitem(last=False)
+
+
+async def get_results(poll_id, method: str) -> dict:
+    """Results of an open multi-select or ranked poll.
+
+    The cached ballots are reused while the poll's ballot version is the one
+    they were loaded at, and reloaded after ballots cast on other instances.
+    """
+    key = str(poll_id)
+    lock = _locks.get(key)
+    if lock is None:
+        lock = _locks[key] = asyncio.Lock()
+    async with lock:
+        # read before loading, so the ballots are at least this new
+        version = await snapshot_cache.current_version(BALLOT_VERSION_KEY.format(key))
+        tally = _tallies.get(key)
+        if tally is None or not _is_current(tally, method, version):
+            tally = await run_in_threadpool(_load, poll_id, method, version)
+            _store(key, tally)
+        else:
+            _tallies.move_to_end(key)
+        if tally.results is not None:
+            return tally.results
+        # instant-runoff over a large poll takes a while, keep it off the loop
+        return await run_in_threadpool(tally.compute)
+
+
+async def record_ballot(poll_id, positions: list, xid: int):
+    """Bump the poll's ballot version for a ballot just committed by this
+    process, and apply the ballot to the cached tally.
+
+    `xid` is the id of the transaction that wrote the ballot. The cache is
+    kept only if no other ballot was versioned since it was loaded; the
+    ballot is added unless the load already read it.
+    """
+    key = str(poll_id)
+    source, number = await snapshot_cache.bump_version(BALLOT_VERSION_KEY.format(key))
+    tally = _tallies.get(key)
+    if tally is None:
+        return
+    if tally.version != (source, number - 1):
+        del _tallies[key]
+        return
+    if not is_visible(tally.snapshot, xid):
+        tally.add(positions)
+    tally.version = (source, number)
+
+
+def forget(poll_id):
+    _tallies.pop(str(poll_id), None)
+    _locks.pop(str(poll_id), None)
+
+
+def runoff_winner(rounds: Optional[list]) -> Optional[str]:
+    """Winner recorded in stored instant-runoff rounds; None for other methods."""
+    if not rounds:
+        return None
+    counts = rounds[-1]["counts"]
+    if not any(counts.values()):
+        return None
+    return max(counts, key=counts.get)
@@ -0,0 +1,99 @@
+"""Bytes on the wire vs CPU cost for compressing poll payloads.
+
+Builds synthetic payloads shaped like the list_polls response and the
+vote_update WebSocket message, then compresses them with gzip, brotli
+(if installed) and raw deflate as used by permessage-deflate.
+
+Usage:
+    python -m benchmarks.compression --polls 200 --options 4
+"""
+import argparse
+import gzip
+import json
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_polls(count: int, options: int) -> list:
+    polls = []
+    for i in range(count):
+        poll_id = str(uuid.uuid4())
+        polls.append({
+            "title": f"Which option do you prefer for question {i}?",
+            "description": "A sample poll used to measure compression",
+            "id": poll_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "likes_count": i % 50,
+            "created_by": f"user{i % 20}",
+            "options": [
+                {"text": f"Option {j}", "id": str(uuid.uuid4()), "poll_id": poll_id, "votes": (i * j) % 997}
+                for j in range(options)
+            ],
+        })
+    return polls
+
+
+def vote_update(poll: dict) -> dict:
+    return {
+        "type": "vote_update",
+        "poll_id": poll["id"],
+        "options": [
+            {"option_id": o["id"], "text": o["text"], "votes": o["votes"]}
+            for o in poll["options"]
+        ],
+    }
+
+
+def deflate_raw(body: bytes, level: int = 6) -> bytes:
+    # permessage-deflate frames are raw deflate without the zlib header
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(body) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def codecs() -> list:
+    result = [("identity", lambda b: b)]
+    for level in (1, 6, 9):
+        result.append((f"gzip-{level}", lambda b, level=level: gzip.compress(b, compresslevel=level, mtime=0)))
+    if brotli is not None:
+        for quality in (1, 5, 9, 11):
+            result.append((f"br-{quality}", lambda b, quality=quality: brotli.compress(b, quality=quality)))
+    result.append(("deflate-raw-6", deflate_raw))
+    return result
+
+
+def measure(name: str, body: bytes, runs: int):
+    print(f"\n{name}: {len(body)} bytes uncompressed")
+    print(f"{'codec':<15}{'bytes':>10}{'ratio':>8}{'us/op':>12}{'MB/s':>10}")
+    for codec, fn in codecs():
+        out = fn(body)
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn(body)
+        elapsed = (time.perf_counter() - start) / runs
+        throughput = len(body) / elapsed / 1e6 if elapsed else float("inf")
+        print(f"{codec:<15}{len(out):>10}{len(body) / len(out):>8.2f}{elapsed * 1e6:>12.1f}{throughput:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--options", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    polls = make_polls(args.polls, args.options)
+    measure(f"list_polls ({args.polls} polls)", json.dumps(polls).encode(), args.runs)
+    measure("vote_update (one poll)", json.dumps(vote_update(polls[0])).encode(), args.runs * 20)
+    if brotli is None:
+        print("\nbrotli is not installed, br rows skipped")
+
+
+if __name__ == "__main__":
+    main()
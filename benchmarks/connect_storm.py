@@ -0,0 +1,81 @@
+"""Connect storm against a running server's per-poll WebSocket.
+
+Opens one observer socket on a poll, then connects many clients at once and
+reports how quickly each joining client receives its snapshot and how many
+messages the observer received because of the storm (ideally none).
+
+Usage:
+    uvicorn app.main:app
+    python -m benchmarks.connect_storm --poll-id <uuid> --clients 2000 --concurrency 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import websockets
+
+
+async def join(url: str, semaphore: asyncio.Semaphore, timings: list, errors: list):
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            async with websockets.connect(url, open_timeout=30) as ws:
+                # vote_update and like_update snapshot
+                await asyncio.wait_for(ws.recv(), 30)
+                await asyncio.wait_for(ws.recv(), 30)
+                timings.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(e)
+
+
+async def drain(ws, counter: list):
+    try:
+        async for _ in ws:
+            counter[0] += 1
+    except websockets.ConnectionClosed:
+        pass
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def main(args):
+    url = f"{args.url.rstrip('/')}/ws/ws/poll/{args.poll_id}"
+
+    async with websockets.connect(url) as observer:
+        await observer.recv()
+        await observer.recv()
+        received = [0]
+        drain_task = asyncio.create_task(drain(observer, received))
+
+        timings, errors = [], []
+        semaphore = asyncio.Semaphore(args.concurrency)
+        start = time.perf_counter()
+        await asyncio.gather(*(join(url, semaphore, timings, errors) for _ in range(args.clients)))
+        elapsed = time.perf_counter() - start
+
+        # give late broadcasts time to arrive
+        await asyncio.sleep(args.settle)
+        drain_task.cancel()
+
+    print(f"clients:                {args.clients} ({len(errors)} failed)")
+    print(f"total time:             {elapsed:.2f}s ({args.clients / elapsed:.0f} joins/s)")
+    if timings:
+        print(f"snapshot latency p50:   {statistics.median(timings) * 1000:.1f} ms")
+        print(f"snapshot latency p99:   {percentile(timings, 0.99) * 1000:.1f} ms")
+    print(f"observer messages:      {received[0]}")
+    if errors:
+        print(f"first error:            {errors[0]!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000")
+    parser.add_argument("--poll-id", required=True)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--settle", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
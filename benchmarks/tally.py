@@ -0,0 +1,105 @@
+"""Tally engine speed on large multi-select and ranked-choice polls.
+
+Generates synthetic ranked ballots (a few popular options, random ballot
+lengths), then times the steps the API runs: turning ballot rows into the
+padded matrix, instant-runoff, approval counts, and appending ballots to a
+cached tally. A plain per-ballot Python runoff over a sample is timed too,
+and its rounds are checked against the vectorized ones.
+
+Usage:
+    python -m benchmarks.tally --ballots 1000000 --options 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.tally import PollTally, approval_counts, ballot_matrix, instant_runoff
+
+
+def make_ballots(count: int, options: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    # Plackett-Luce rankings: sorting log-weights plus Gumbel noise
+    weights = np.log(rng.pareto(1.5, options) + 0.1)
+    keys = weights + rng.gumbel(size=(count, options))
+    rankings = np.argsort(-keys, axis=1).astype(np.int16)
+    lengths = rng.integers(1, options + 1, size=count)
+    return [row[:length] for row, length in zip(rankings.tolist(), lengths.tolist())]
+
+
+def naive_runoff(ballots: list, options: int) -> list:
+    # reference implementation: recount every ballot every round
+    active = set(range(options))
+    first = None
+    rounds = []
+    while True:
+        counts = [0] * options
+        for ballot in ballots:
+            for choice in ballot:
+                if choice in active:
+                    counts[choice] += 1
+                    break
+        first = first or counts[:]
+        rounds.append(counts)
+        continuing = sum(counts)
+        remaining = sorted(active)
+        if continuing == 0:
+            return rounds
+        leader = max(remaining, key=lambda option: (counts[option], -option))
+        if counts[leader] * 2 > continuing or len(remaining) == 1:
+            return rounds
+        fewest = min(counts[option] for option in remaining)
+        tied = [option for option in remaining if counts[option] == fewest]
+        fewest_first = min(first[option] for option in tied)
+        active.discard([option for option in tied if first[option] == fewest_first][-1])
+
+
+def timed(label: str, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    print(f"{label:<40} {(time.perf_counter() - start) * 1000:>10.1f} ms")
+    return result
+
+
+def main(args):
+    print(f"{args.ballots} ballots, {args.options} options")
+    ballots = timed("generate (not part of the engine)", make_ballots, args.ballots, args.options, args.seed)
+
+    matrix = timed("ballot rows -> matrix", ballot_matrix, ballots, args.options)
+    print(f"{'matrix size':<40} {matrix.nbytes / 2**20:>10.1f} MB")
+    runoff = timed("instant-runoff", instant_runoff, matrix, args.options)
+    print(f"{'rounds':<40} {len(runoff['rounds']):>10}   winner: option {runoff['winner']}")
+    timed("approval counts", approval_counts, matrix, args.options)
+
+    tally = PollTally("ranked", [str(i) for i in range(args.options)], matrix)
+    extra = make_ballots(args.appends, args.options, args.seed + 1)
+    start = time.perf_counter()
+    for ballot in extra:
+        tally.add(ballot)
+    per_add = (time.perf_counter() - start) / max(len(extra), 1) * 1e6
+    print(f"{'append to cached tally':<40} {per_add:>10.1f} us/ballot ({len(extra)} ballots)")
+    timed("instant-runoff after appends", tally.compute)
+
+    approvals = PollTally("multi", [str(i) for i in range(args.options)], matrix)
+    start = time.perf_counter()
+    for ballot in extra:
+        approvals.add(ballot)
+    per_add = (time.perf_counter() - start) / max(len(extra), 1) * 1e6
+    print(f"{'multi-select incremental count':<40} {per_add:>10.1f} us/ballot")
+
+    sample = ballots[:args.naive_sample]
+    sample_matrix = ballot_matrix(sample, args.options)
+    vectorized = timed(f"instant-runoff, {len(sample)} ballots", instant_runoff, sample_matrix, args.options)
+    naive = timed(f"per-ballot Python, {len(sample)} ballots", naive_runoff, sample, args.options)
+    assert [list(map(int, r["counts"])) for r in vectorized["rounds"]] == naive, "rounds differ"
+    print("rounds match the per-ballot runoff")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ballots", type=int, default=1_000_000)
+    parser.add_argument("--options", type=int, default=8)
+    parser.add_argument("--appends", type=int, default=10_000, help="ballots appended to the cached tally")
+    parser.add_argument("--naive-sample", type=int, default=100_000, help="ballots for the per-ballot comparison")
+    parser.add_argument("--seed", type=int, default=7)
+    main(parser.parse_args())
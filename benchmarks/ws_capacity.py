@@ -0,0 +1,165 @@
+"""Connections-per-core benchmark for the WebSocket gateway.
+
+Ramps up idle sockets on a running gateway in steps. At each step it
+publishes test messages straight to Redis and measures how long the gateway
+takes to fan each one out to every socket. With --server-pid it also samples
+the gateway's CPU use and resident memory from /proc (Linux only).
+
+Run the gateway as a single worker pinned to one core, and the load
+generator on other cores (--cpu), so the numbers are per core:
+    REDIS_URL=redis://localhost:6379 taskset -c 0 uvicorn app.gateway:app --port 8001 --workers 1
+    python -m benchmarks.ws_capacity --url ws://localhost:8001 --redis-url redis://localhost:6379 \\
+        --connections 10000 --step 2000 --server-pid <gateway pid> --cpu 1
+
+"sock/core" is the open sockets divided by the cores the gateway used while
+messages were published, i.e. how many sockets one fully busy core would
+carry at the same message rate.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import redis.asyncio as redis
+import websockets
+
+
+CHANNEL = "polls:global"
+
+
+class Client:
+    def __init__(self):
+        self.received = {}
+        self.task = None
+
+
+async def connect(url: str, semaphore: asyncio.Semaphore, clients: list, errors: list):
+    async with semaphore:
+        try:
+            ws = await websockets.connect(url, open_timeout=60, max_queue=None)
+        except Exception as e:
+            errors.append(e)
+            return
+    client = Client()
+    client.task = asyncio.create_task(listen(ws, client))
+    clients.append(client)
+
+
+async def listen(ws, client: Client):
+    try:
+        async for raw in ws:
+            message = json.loads(raw)
+            if message.get("type") == "bench":
+                client.received[message["seq"]] = time.time()
+    except websockets.ConnectionClosed:
+        pass
+
+
+def cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime + stime, in clock ticks
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def measure(redis_conn, clients: list, seq_start: int, messages: int, interval: float) -> dict:
+    sent = {}
+    for seq in range(seq_start, seq_start + messages):
+        sent[seq] = time.time()
+        await redis_conn.publish(CHANNEL, json.dumps({"type": "bench", "seq": seq, "sent": sent[seq]}))
+        await asyncio.sleep(interval)
+
+    # wait until every client has every message, or give up
+    deadline = time.time() + 30
+    while time.time() < deadline and any(len(client.received) < seq_start + messages for client in clients):
+        await asyncio.sleep(0.05)
+
+    fanout, delivery, missing = [], [], 0
+    for seq, sent_at in sent.items():
+        arrivals = [client.received[seq] for client in clients if seq in client.received]
+        missing += len(clients) - len(arrivals)
+        if arrivals:
+            fanout.append((max(arrivals) - sent_at) * 1000)
+            delivery.extend((arrival - sent_at) * 1000 for arrival in arrivals)
+    return {"fanout": fanout, "delivery": delivery, "missing": missing}
+
+
+async def main(args):
+    if args.cpu is not None:
+        os.sched_setaffinity(0, args.cpu)
+        print(f"load generator pinned to cores {sorted(os.sched_getaffinity(0))}")
+    if args.server_pid:
+        print(f"gateway runs on cores {sorted(os.sched_getaffinity(args.server_pid))}")
+    url = f"{args.url.rstrip('/')}/ws/ws/poll"
+    redis_conn = redis.from_url(args.redis_url)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    clients, errors = [], []
+    seq = 0
+
+    print(f"{'sockets':>8} {'errors':>7} {'connect/s':>10} {'rss MB':>8} {'KB/sock':>8} {'cpu %':>6} "
+          f"{'sock/core':>10} {'fanout p50':>11} {'fanout p99':>11} {'deliver p99':>12} {'missing':>8}")
+    baseline_rss = rss_mb(args.server_pid) if args.server_pid else None
+
+    while len(clients) < args.connections:
+        target = min(args.connections, len(clients) + args.step)
+        start = time.perf_counter()
+        await asyncio.gather(*(connect(url, semaphore, clients, errors) for _ in range(target - len(clients))))
+        connect_rate = (target - len(errors)) / max(time.perf_counter() - start, 1e-9)
+        await asyncio.sleep(1)
+
+        cpu_before = cpu_seconds(args.server_pid) if args.server_pid else None
+        window = time.perf_counter()
+        result = await measure(redis_conn, clients, seq, args.messages, 1 / args.rate)
+        window = time.perf_counter() - window
+        seq += args.messages
+
+        cpu = rss = per_socket = per_core = None
+        if args.server_pid:
+            cpu = (cpu_seconds(args.server_pid) - cpu_before) / window * 100
+            rss = rss_mb(args.server_pid)
+            per_socket = (rss - baseline_rss) * 1024 / max(len(clients), 1)
+            per_core = len(clients) / (cpu / 100) if cpu else None
+
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else "-"
+
+        print(f"{len(clients):>8} {len(errors):>7} {connect_rate:>10.0f} {fmt(rss, '>8.1f')} {fmt(per_socket, '>8.1f')} "
+              f"{fmt(cpu, '>6.0f')} {fmt(per_core, '>10.0f')} {statistics.median(result['fanout']):>11.1f} {percentile(result['fanout'], 0.99):>11.1f} "
+              f"{percentile(result['delivery'], 0.99):>12.1f} {result['missing']:>8}")
+        if errors:
+            print(f"stopping: {len(errors)} connections failed, first error: {errors[0]!r}")
+            break
+
+    for client in clients:
+        client.task.cancel()
+    await redis_conn.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8001")
+    parser.add_argument("--redis-url", default="redis://localhost:6379")
+    parser.add_argument("--connections", type=int, default=5000)
+    parser.add_argument("--step", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="connections opened at once")
+    parser.add_argument("--messages", type=int, default=20, help="test messages per step")
+    parser.add_argument("--rate", type=float, default=10, help="test messages per second")
+    parser.add_argument("--server-pid", type=int, help="gateway process id, for CPU and memory")
+    parser.add_argument("--cpu", type=lambda value: {int(core) for core in value.split(",")},
+                        help="comma-separated cores to pin the load generator to (Linux only)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,96 @@
+# tests/test_closing.py
+# Single-vote polls close without Postgres-only types, so these run on an
+# in-memory SQLite database holding just the tables closing reads.
+import uuid
+import asyncio
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db import Base
+from app import models
+from app.routes import polls
+from app.utils import closing
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    tables = [model.__table__ for model in (models.User, models.Poll, models.Option, models.Vote, models.PollResult)]
+    Base.metadata.create_all(bind=engine, tables=tables)
+    factory = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    monkeypatch.setattr(closing, "sessionlocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def add_poll(db, votes: int, closes_at=None) -> models.Poll:
+    user = models.User(username="owner", email="owner@x.com", hashed_password="x")
+    poll = models.Poll(title="t", created_by="owner", closes_at=closes_at)
+    db.add_all([user, poll])
+    db.flush()
+    option = models.Option(poll_id=poll.id, text="a", position=0)
+    db.add(option)
+    db.flush()
+    for _ in range(votes):
+        db.add(models.Vote(poll_id=poll.id, option_id=option.id, user_id=user.id))
+    db.commit()
+    return poll
+
+
+def test_freeze_results_only_first_call_freezes(sessions):
+    db = sessions()
+    poll = add_poll(db, votes=2)
+    first, frozen = closing.freeze_results(db, poll.id)
+    again, frozen_again = closing.freeze_results(db, poll.id)
+    assert frozen and not frozen_again
+    assert first["total_votes"] == 2
+    # SQLite hands closed_at back without its time zone
+    assert (again["tallies"], again["closed_at"]) == (first["tallies"], first["closed_at"].replace(tzinfo=None))
+    assert closing.is_known_closed(poll.id)
+    db.close()
+
+
+def test_freeze_results_of_missing_poll(sessions):
+    db = sessions()
+    assert closing.freeze_results(db, uuid.uuid4()) == (None, False)
+    db.close()
+
+
+def test_close_due_polls_returns_each_poll_once(sessions):
+    db = sessions()
+    due = str(add_poll(db, votes=1, closes_at=closing.utcnow() - timedelta(minutes=1)).id)
+    db.close()
+    assert [result["poll_id"] for result in closing.close_due_polls()] == [due]
+    assert closing.close_due_polls() == []
+
+
+def test_close_poll_broadcasts_once(sessions, monkeypatch):
+    sent = []
+
+    async def broadcast(results):
+        sent.append(results)
+
+    monkeypatch.setattr(polls, "broadcast_poll_closed", broadcast)
+    db = sessions()
+    poll = add_poll(db, votes=0)
+    owner = db.query(models.User).first()
+    first = asyncio.run(polls.close_poll(poll.id, db=db, current_user=owner))
+    asyncio.run(polls.close_poll(poll.id, db=db, current_user=owner))
+    assert sent == [first]
+    db.close()
+
+
+def test_close_poll_purged_while_closing(sessions, monkeypatch):
+    monkeypatch.setattr(closing, "freeze_results", lambda db, poll_id: (None, False))
+    db = sessions()
+    poll = add_poll(db, votes=0)
+    owner = db.query(models.User).first()
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(polls.close_poll(poll.id, db=db, current_user=owner))
+    assert error.value.status_code == 404
+    db.close()
@@ -0,0 +1,121 @@
+# tests/test_event_hub.py
+# The hub runs without Redis here: events come from dispatch(), as they do
+# through send_local() when Redis is down.
+import asyncio
+import json
+
+from app.routes import events
+from app.utils.event_hub import Event, EventHub
+
+
+def message(n: int) -> str:
+    return json.dumps({"type": "vote_update", "n": n})
+
+
+def test_replay_after_sole_subscriber_reconnects():
+    async def run():
+        hub = EventHub()
+        queue = await hub.subscribe("poll:1")
+        hub.dispatch("poll:1", message(1))
+        first = queue.get_nowait()
+        hub.unsubscribe("poll:1", queue)
+        # published while nobody was connected
+        hub.dispatch("poll:1", message(2))
+        await hub.subscribe("poll:1")
+        replayed = hub.replay("poll:1", first.id)
+        await hub.close()
+        return replayed
+
+    replayed = asyncio.run(run())
+    assert [event.message["n"] for event in replayed] == [2]
+
+
+def test_replay_not_covered_after_grace_period():
+    async def run():
+        hub = EventHub(grace=0)
+        queue = await hub.subscribe("poll:1")
+        hub.dispatch("poll:1", message(1))
+        first = queue.get_nowait()
+        hub.unsubscribe("poll:1", queue)
+        await asyncio.sleep(0.01)
+        await hub.subscribe("poll:1")
+        replayed = hub.replay("poll:1", first.id)
+        await hub.close()
+        return replayed
+
+    assert asyncio.run(run()) is None
+
+
+def test_replay_not_covered_once_evicted():
+    async def run():
+        hub = EventHub(replay_size=2)
+        queue = await hub.subscribe("poll:1")
+        for n in range(4):
+            hub.dispatch("poll:1", message(n))
+        ids = [queue.get_nowait().id for _ in range(4)]
+        result = hub.replay("poll:1", ids[0]), hub.replay("poll:1", ids[1])
+        await hub.close()
+        return result
+
+    evicted, covered = asyncio.run(run())
+    assert evicted is None
+    assert [event.message["n"] for event in covered] == [2, 3]
+
+
+def test_slow_subscriber_is_ended():
+    async def run():
+        hub = EventHub(queue_size=2)
+        queue = await hub.subscribe("poll:1")
+        for n in range(3):
+            hub.dispatch("poll:1", message(n))
+        result = queue.get_nowait(), hub.subscriber_count()
+        await hub.close()
+        return result
+
+    assert asyncio.run(run()) == (None, 0)
+
+
+async def first_events(stream, count: int) -> list:
+    try:
+        return [await stream.__anext__() for _ in range(count)]
+    finally:
+        await stream.aclose()
+
+
+async def snapshot():
+    return [Event(0, "poll:1", {"type": "vote_update", "n": "snapshot"}, message(0))]
+
+
+def test_stream_sends_snapshot_when_replay_not_covered(monkeypatch):
+    async def run():
+        hub = EventHub(replay_size=1)
+        monkeypatch.setattr(events, "event_hub", hub)
+        queue = await hub.subscribe("poll:1")
+        for n in range(3):
+            hub.dispatch("poll:1", message(n))
+        # the client saw the first event; the second was evicted by the third
+        last_event_id = f"{hub.epoch}-{queue.get_nowait().id}"
+        sent = await first_events(events._event_stream("poll:1", last_event_id, snapshot=snapshot), 2)
+        await hub.close()
+        return sent
+
+    retry, first = asyncio.run(run())
+    assert retry == b"retry: 3000\n\n"
+    assert first.startswith(b"id: 0\n")
+
+
+def test_stream_replays_when_covered(monkeypatch):
+    async def run():
+        hub = EventHub()
+        monkeypatch.setattr(events, "event_hub", hub)
+        queue = await hub.subscribe("poll:1")
+        hub.dispatch("poll:1", message(1))
+        hub.dispatch("poll:1", message(2))
+        last_event_id = f"{hub.epoch}-{queue.get_nowait().id}"
+        second = queue.get_nowait()
+        sent = await first_events(events._event_stream("poll:1", last_event_id, snapshot=snapshot), 2)
+        await hub.close()
+        return sent, second
+
+    (_, replayed), second = asyncio.run(run())
+    assert replayed == second.sse
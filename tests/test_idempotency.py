@@ -0,0 +1,63 @@
+# tests/test_idempotency.py
+# Keys are reserved in the in-process store when Redis is not initialised;
+# the Redis path runs against fakeredis when it is installed.
+import uuid
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import redis_pool
+from app.utils import idempotency
+
+
+@pytest.fixture(params=["local", "redis"])
+def store(request, monkeypatch):
+    if request.param == "redis":
+        fakeredis = pytest.importorskip("fakeredis")
+        monkeypatch.setattr(redis_pool, "redis_client", fakeredis.FakeAsyncRedis(decode_responses=True))
+    return request.param
+
+
+def reserve(key: str, request_hash: str = "a"):
+    return idempotency.begin("votes", "user", key, request_hash)
+
+
+def test_retry_while_in_progress_is_rejected(store):
+    async def run():
+        key = uuid.uuid4().hex
+        assert await reserve(key) is None
+        with pytest.raises(HTTPException) as in_progress:
+            await reserve(key)
+        with pytest.raises(HTTPException) as reused:
+            await reserve(key, "b")
+        return in_progress.value.status_code, reused.value.status_code
+
+    assert asyncio.run(run()) == (409, 422)
+
+
+def test_completed_response_is_replayed(store):
+    async def run():
+        key = uuid.uuid4().hex
+        await reserve(key)
+        await idempotency.complete("votes", "user", key, "a", {"vote_id": 1})
+        return await reserve(key)
+
+    assert asyncio.run(run()) == {"vote_id": 1}
+
+
+def test_released_key_can_be_retried(store):
+    async def run():
+        key = uuid.uuid4().hex
+        await reserve(key)
+        await idempotency.release("votes", "user", key)
+        return await reserve(key)
+
+    assert asyncio.run(run()) is None
+
+
+def test_requests_without_a_key_are_not_tracked(store):
+    async def run():
+        return [await reserve(None), await reserve(None)]
+
+    assert asyncio.run(run()) == [None, None]
@@ -0,0 +1,89 @@
+# tests/test_redis_pool.py
+# The breaker is driven with a fake probe; no Redis server is needed.
+import asyncio
+
+from app import redis_pool
+from app.redis_pool import CircuitBreaker
+
+
+class Probe:
+    """Fails the first `failures` calls, then succeeds."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("down")
+
+
+def test_breaker_trips_after_threshold(monkeypatch):
+    monkeypatch.setattr(redis_pool, "BREAKER_PROBE_INTERVAL", 60)
+
+    async def run():
+        breaker = CircuitBreaker(Probe())
+        for _ in range(redis_pool.BREAKER_FAILURE_THRESHOLD - 1):
+            breaker.record_failure(ConnectionError("down"))
+        before = breaker.is_open
+        breaker.record_failure(ConnectionError("down"))
+        after = breaker.is_open
+        await breaker.close()
+        return before, after
+
+    assert asyncio.run(run()) == (False, True)
+
+
+def test_success_resets_failure_count(monkeypatch):
+    monkeypatch.setattr(redis_pool, "BREAKER_PROBE_INTERVAL", 60)
+
+    async def run():
+        breaker = CircuitBreaker(Probe())
+        for _ in range(redis_pool.BREAKER_FAILURE_THRESHOLD - 1):
+            breaker.record_failure(ConnectionError("down"))
+        breaker.record_success()
+        breaker.record_failure(ConnectionError("down"))
+        is_open = breaker.is_open
+        await breaker.close()
+        return is_open
+
+    assert asyncio.run(run()) is False
+
+
+def test_open_breaker_fails_fast(monkeypatch):
+    monkeypatch.setattr(redis_pool, "BREAKER_PROBE_INTERVAL", 60)
+    monkeypatch.setattr(redis_pool, "redis_client", object())
+
+    async def run():
+        monkeypatch.setattr(redis_pool, "breaker", CircuitBreaker(Probe()))
+        connected = await redis_pool.get_redis()
+        redis_pool.breaker.trip(ConnectionError("down"))
+        while_open = await redis_pool.get_redis()
+        await redis_pool.breaker.close()
+        return connected, while_open
+
+    connected, while_open = asyncio.run(run())
+    assert connected is not None
+    assert while_open is None
+
+
+def test_probe_backs_off_then_recovers(monkeypatch):
+    monkeypatch.setattr(redis_pool, "BREAKER_PROBE_INTERVAL", 0.01)
+    recovered = []
+
+    async def run():
+        probe = Probe(failures=2)
+        breaker = CircuitBreaker(probe)
+
+        async def on_recover():
+            recovered.append(breaker.is_open)
+
+        breaker.on_recover.append(on_recover)
+        breaker.trip(ConnectionError("down"))
+        await asyncio.wait_for(breaker._probe_task, 1)
+        return probe.calls, breaker.is_open
+
+    assert asyncio.run(run()) == (3, False)
+    # callbacks run once the breaker is closed again
+    assert recovered == [False]
@@ -0,0 +1,119 @@
+# tests/test_tally.py
+# Ballot counting in SQL needs Postgres (array columns); those tests run only
+# when TEST_DATABASE_URL points at a scratch database, e.g.
+#   TEST_DATABASE_URL=postgresql+psycopg2://postgres@localhost/polls_test python -m pytest tests
+import os
+import uuid
+import asyncio
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db import Base
+from app import models
+from app.utils import snapshot_cache, tally
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+requires_postgres = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.create_all(bind=engine)
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+
+
+def add_poll(db, method: str, ballots: list):
+    poll = models.Poll(title="t", created_by="u", voting_method=method)
+    db.add(poll)
+    db.flush()
+    for position in range(3):
+        db.add(models.Option(poll_id=poll.id, text=str(position), position=position))
+    for choices in ballots:
+        user = models.User(username=uuid.uuid4().hex[:12], email=f"{uuid.uuid4().hex[:12]}@x.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(models.Ballot(poll_id=poll.id, user_id=user.id, choices=choices))
+    db.flush()
+    return poll
+
+
+@requires_postgres
+def test_preference_counts_multi_counts_every_approval(db):
+    poll = add_poll(db, "multi", [[0, 2], [2], [1, 2, 0]])
+    assert tally.preference_counts(db, poll.id, "multi") == {0: 2, 1: 1, 2: 3}
+
+
+@requires_postgres
+def test_preference_counts_ranked_counts_first_choices(db):
+    poll = add_poll(db, "ranked", [[0, 2], [2, 0], [2, 1, 0]])
+    assert tally.preference_counts(db, poll.id, "ranked") == {0: 1, 2: 2}
+
+
+@requires_postgres
+def test_preference_counts_without_ballots(db):
+    poll = add_poll(db, "multi", [])
+    assert tally.preference_counts(db, poll.id, "multi") == {}
+
+
+def test_instant_runoff_transfers_eliminated_ballots():
+    # option 2 is eliminated first and its ballots move to option 1
+    ballots = tally.ballot_matrix([[0], [0], [1], [1, 0], [2, 1]], 3)
+    runoff = tally.instant_runoff(ballots, 3)
+    assert [list(map(int, round_["counts"])) for round_ in runoff["rounds"]] == [[2, 2, 1], [2, 3, 0]]
+    assert runoff["winner"] == 1
+
+
+def test_multi_tally_add_matches_recount():
+    ballots = [[0, 2], [2], [1, 2, 0]]
+    cached = tally.PollTally("multi", ["a", "b", "c"], tally.ballot_matrix(ballots[:1], 3))
+    for choices in ballots[1:]:
+        cached.add(choices)
+    recount = tally.approval_counts(tally.ballot_matrix(ballots, 3), 3)
+    assert np.array_equal(cached.counts, recount)
+
+
+def cached_multi_tally(key: str, snapshot: tuple) -> tally.PollTally:
+    # versions are process-local while Redis is not initialised
+    version = asyncio.run(snapshot_cache.current_version(tally.BALLOT_VERSION_KEY.format(key)))
+    cached = tally.PollTally("multi", ["a", "b"], tally.ballot_matrix([[0]], 2), version, snapshot)
+    tally._store(key, cached)
+    return cached
+
+
+def test_record_ballot_skips_ballots_the_load_already_read():
+    key = str(uuid.uuid4())
+    # loaded after transaction 101 committed, while 102 was still running
+    cached = cached_multi_tally(key, (101, 103, frozenset({102})))
+    asyncio.run(tally.record_ballot(key, [0], 101))
+    asyncio.run(tally.record_ballot(key, [1], 102))
+    assert tally._tallies[key] is cached
+    assert list(cached.counts) == [1, 1]
+    tally.forget(key)
+
+
+def test_record_ballot_drops_tally_missing_other_ballots():
+    key = str(uuid.uuid4())
+    cached_multi_tally(key, (101, 101, frozenset()))
+    # a ballot cast on another instance bumped the version in between
+    asyncio.run(snapshot_cache.bump_version(tally.BALLOT_VERSION_KEY.format(key)))
+    asyncio.run(tally.record_ballot(key, [1], 105))
+    assert key not in tally._tallies
+
+
+def test_parse_snapshot():
+    assert tally.parse_snapshot("100:104:100,102") == (100, 104, frozenset({100, 102}))
+    assert tally.parse_snapshot("7:7:") == (7, 7, frozenset())